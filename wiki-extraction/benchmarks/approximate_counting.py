@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Compares the approximate counting mode against exact counting on a sample of a dump. The sample is
+# translated once, its pairs are stored in a temp file and replayed into each counter, so every
+# counter sees identical input. Pairs are counted in exact shards that are merged into the counter
+# under test, like build_dictionary.py does with worker shards. Reports peak heap use (including
+# NumPy buffers) while counting and printing, time, and how well the approximate dictionary matches
+# the exact one.
+
+import io
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from functools import partial
+from multiprocessing import Pool
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'bin'))
+
+from approximate_counter import ApproximateTranslationCounter
+from build_dictionary import articles_to_pairs, batches
+from translation_counter import TranslationCounter
+from wikipedia import articles
+
+
+def dump_pairs(opts, fn):
+    pool = Pool(processes=opts.procs)
+    gen = batches(articles(opts.input_file, limit=opts.limit), 256 * 1024)
+    n_articles = 0
+
+    with io.open(fn, mode='wb') as f:
+        for results in pool.imap(partial(articles_to_pairs, direction=opts.direction), gen):
+            for pairs in results:
+                pickle.dump(pairs, f, protocol=pickle.HIGHEST_PROTOCOL)
+                n_articles += 1
+
+    pool.close()
+
+    return n_articles
+
+
+def replay(fn):
+    with io.open(fn, mode='rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def entries(text):
+    result = set()
+
+    for line in text.splitlines():
+        key, items = line.split('\t')
+        result.update((key, item.rsplit(':', 1)[0]) for item in items.split())
+
+    return result
+
+
+def run(counter_factory, fn, shard_docs):
+    tracemalloc.start()
+    start = time.time()
+
+    counter = counter_factory()
+    shard = TranslationCounter()
+
+    for pairs in replay(fn):
+        shard.update(pairs)
+
+        if shard.count_docs >= shard_docs:
+            counter.merge(shard)
+            shard = TranslationCounter()
+
+    counter.merge(shard)
+    del shard
+
+    out = io.StringIO()
+    counter.print(out)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return entries(out.getvalue()), peak, time.time() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-i', '--input-file')
+    parser.add_argument('-l', '--limit', default=10000, type=int)
+    parser.add_argument('-p', '--procs', default=1, type=int)
+    parser.add_argument('-d', '--direction', default='nno-nob')
+    parser.add_argument('-s', '--source-df-filter', default=0.5, type=float)
+    parser.add_argument('-t', '--trans-df-filter', default=1.0, type=float)
+    parser.add_argument('-S', '--source-tf-filter', default=5, type=int)
+    parser.add_argument('-T', '--trans-tf-filter', default=5, type=int)
+    parser.add_argument('-n', '--top-n', default=5, type=int)
+    parser.add_argument('-e', '--epsilons', default=[1e-4, 1e-5, 2e-6], type=float, nargs='+')
+    parser.add_argument('--delta', default=0.01, type=float)
+    parser.add_argument('--shard-docs', default=1000, type=int)
+    parser.add_argument('--pair-capacities', default=[0], type=int, nargs='+')
+    opts = parser.parse_args()
+
+    if not opts.input_file:
+        logging.error("missing input file ...")
+        sys.exit(1)
+
+    filters = dict(source_tf_filter=opts.source_tf_filter, source_df_filter=opts.source_df_filter,
+                   trans_tf_filter=opts.trans_tf_filter, trans_df_filter=opts.trans_df_filter, top_n=opts.top_n)
+
+    fd, pairs_fn = tempfile.mkstemp(prefix='pairs-')
+    os.close(fd)
+
+    try:
+        n_articles = dump_pairs(opts, pairs_fn)
+        logging.info("translated %d articles" % n_articles)
+
+        exact, exact_peak, exact_time = run(partial(TranslationCounter, **filters), pairs_fn, opts.shard_docs)
+
+        print('%-28s %10s %8s %8s %9s %9s' % ('mode', 'peak MB', 'secs', 'entries', 'precision', 'recall'))
+        print('%-28s %10.1f %8.2f %8d %9s %9s' % ('exact', exact_peak / 1e6, exact_time, len(exact), '-', '-'))
+
+        for capacity in opts.pair_capacities:
+            for epsilon in opts.epsilons:
+                factory = partial(ApproximateTranslationCounter, epsilon=epsilon, delta=opts.delta,
+                                  pair_capacity=capacity or None, **filters)
+                approx, peak, secs = run(factory, pairs_fn, opts.shard_docs)
+                common = len(exact & approx)
+
+                print('%-28s %10.1f %8.2f %8d %9.4f %9.4f' %
+                      ('eps=%g pairs=%s' % (epsilon, capacity or 'all'), peak / 1e6, secs, len(approx),
+                       common / float(max(len(approx), 1)), common / float(max(len(exact), 1))))
+    finally:
+        os.remove(pairs_fn)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
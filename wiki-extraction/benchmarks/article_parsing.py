@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Times parsing of a dump sample held in memory: full decoding of both lines as articles() used to do,
+# wikipedia.parse_page() with the stdlib json module, and parse_page() with orjson when it is installed.
+# Every parser must return the same articles.
+
+import io
+import json
+import logging
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from bz2 import BZ2File
+from gzip import GzipFile
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+import wikipedia
+from wikipedia import is_page, parse_page
+
+
+def sample(fn, max_bytes):
+    _, ext = os.path.splitext(fn)
+
+    if ext == '.gz':
+        f = GzipFile(fn, mode='r')
+    elif ext == '.bz2':
+        f = BZ2File(fn, mode='r')
+    else:
+        f = io.open(fn, mode='rb')
+
+    lines = []
+    size = 0
+
+    while size < max_bytes:
+        action_line = f.readline()
+        source_line = f.readline()
+
+        if not source_line:
+            break
+
+        lines.append((action_line, source_line))
+        size += len(action_line) + len(source_line)
+
+    f.close()
+
+    return lines, size
+
+
+def parse_full(action_line, source_line):
+    action = json.loads(action_line.decode('utf-8'))
+    source = json.loads(source_line.decode('utf-8'))
+
+    if is_page(action, source):
+        return {'id': action['index']['_id'], 'title': source['title'], 'text': source['text']}
+
+    return None
+
+
+def run(parse, lines, repeat):
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        start = time.time()
+        result = [article for article in (parse(a, s) for a, s in lines) if article is not None]
+        secs = time.time() - start
+        best = secs if best is None else min(best, secs)
+
+    return result, best
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-i', '--input-file')
+    parser.add_argument('-m', '--sample-mb', default=200, type=int, help='uncompressed MB read from the dump')
+    parser.add_argument('-r', '--repeat', default=3, type=int)
+    opts = parser.parse_args()
+
+    if not opts.input_file:
+        logging.error("missing input file ...")
+        sys.exit(1)
+
+    lines, size = sample(opts.input_file, opts.sample_mb * 1024 * 1024)
+    orjson = wikipedia.orjson
+
+    parsers = [('json, full decode', parse_full, None)]
+    wikipedia.orjson = None
+    parsers.append(('parse_page, json', parse_page, None))
+
+    if orjson is not None:
+        parsers.append(('parse_page, orjson', parse_page, orjson))
+
+    expected = None
+    baseline = None
+
+    print('%d documents, %.1f MB' % (len(lines), size / 1e6))
+    print('%-24s %8s %10s %12s %8s' % ('parser', 'secs', 'MB/s', 'articles/s', 'speedup'))
+
+    for name, parse, backend in parsers:
+        wikipedia.orjson = backend
+        result, secs = run(parse, lines, opts.repeat)
+
+        if expected is None:
+            expected = result
+            baseline = secs
+        elif result != expected:
+            logging.error("%s returned different articles" % name)
+            sys.exit(1)
+
+        print('%-24s %8.2f %10.1f %12.0f %7.2fx' % (name, secs, size / 1e6 / secs, len(result) / secs,
+                                                  baseline / secs))
+
+    wikipedia.orjson = orjson
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
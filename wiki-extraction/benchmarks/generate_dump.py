@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Writes a synthetic cirrussearch dump (.json, .json.gz or .json.bz2) for benchmarks. Words are drawn
+# from a vocabulary of made up Norwegian looking words with Zipf distributed frequencies, a larger skew
+# makes the most common words more dominant. The same seed gives the same dump.
+
+import bz2
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from itertools import accumulate
+
+_ONSETS = ['', 'b', 'bl', 'd', 'f', 'fj', 'g', 'gr', 'h', 'hj', 'k', 'kv', 'l', 'm', 'n', 'p', 'r', 's', 'sk', 'st',
+           't', 'tr', 'v']
+_VOWELS = ['a', 'e', 'i', 'o', 'u', 'y', 'æ', 'ø', 'å', 'ei', 'au']
+_CODAS = ['', 'n', 'r', 'l', 'm', 's', 'k', 'g', 'nd', 'st', 'tt']
+
+
+def word(idx):
+    # distinct words for distinct indexes, one to four syllables
+    syllables = []
+
+    while True:
+        idx, rest = divmod(idx, len(_ONSETS) * len(_VOWELS) * len(_CODAS))
+        onset, rest = divmod(rest, len(_VOWELS) * len(_CODAS))
+        vowel, coda = divmod(rest, len(_CODAS))
+        syllables.append(_ONSETS[onset] + _VOWELS[vowel] + _CODAS[coda])
+
+        if idx == 0:
+            return ''.join(syllables)
+
+        idx -= 1
+
+
+class DumpGenerator():
+    def __init__(self, vocabulary=50000, skew=1.1, words_per_article=300, words_per_sentence=15, seed=1):
+        self.vocabulary = [word(idx) for idx in range(vocabulary)]
+        self.cum_weights = list(accumulate(1.0 / (rank + 1) ** skew for rank in range(vocabulary)))
+        self.words_per_article = words_per_article
+        self.words_per_sentence = words_per_sentence
+        self.rng = random.Random(seed)
+
+    def sentence(self):
+        n = max(1, int(self.rng.expovariate(1.0 / self.words_per_sentence)))
+        words = self.rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=n)
+
+        return ' '.join(words).capitalize() + '.'
+
+    def article(self):
+        target = max(1, int(self.rng.expovariate(1.0 / self.words_per_article)))
+        sentences = []
+        n = 0
+
+        while n < target:
+            sentences.append(self.sentence())
+            n += sentences[-1].count(' ') + 1
+
+        title = ' '.join(self.rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=2)).title()
+
+        return {'namespace': 0, 'title': title, 'text': ' '.join(sentences), 'timestamp': '2016-01-01T00:00:00Z'}
+
+    def write(self, fn, n_articles):
+        _, ext = os.path.splitext(fn)
+
+        if ext == '.gz':
+            f = gzip.open(fn, mode='wb')
+        elif ext == '.bz2':
+            f = bz2.BZ2File(fn, mode='wb')
+        else:
+            f = io.open(fn, mode='wb')
+
+        with f:
+            for page_id in range(1, n_articles + 1):
+                action = {'index': {'_type': 'page', '_id': str(page_id)}}
+                f.write(json.dumps(action).encode('utf-8') + b'\n')
+                f.write(json.dumps(self.article(), ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-o', '--output-file', help='.json, .json.gz or .json.bz2')
+    parser.add_argument('-n', '--articles', default=10000, type=int)
+    parser.add_argument('-v', '--vocabulary', default=50000, type=int, help='number of distinct words')
+    parser.add_argument('-z', '--skew', default=1.1, type=float, help='Zipf exponent of word frequencies')
+    parser.add_argument('-w', '--words-per-article', default=300, type=int, help='mean words per article')
+    parser.add_argument('--words-per-sentence', default=15, type=int, help='mean words per sentence')
+    parser.add_argument('-s', '--seed', default=1, type=int)
+    opts = parser.parse_args()
+
+    if not opts.output_file:
+        logging.error("missing output file ...")
+        sys.exit(1)
+
+    DumpGenerator(vocabulary=opts.vocabulary, skew=opts.skew, words_per_article=opts.words_per_article,
+                  words_per_sentence=opts.words_per_sentence, seed=opts.seed).write(opts.output_file, opts.articles)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
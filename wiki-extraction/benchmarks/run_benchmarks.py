@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# Runs the dictionary and synonym scripts on synthetic dumps with the fake apertium and reports wall
+# time, throughput and peak RSS of each run. build_dictionary.py is run with every --procs given to
+# show scaling, and so is create_synonyms.py. Peak RSS is of the largest process of a run, workers included.
+# With -c BASELINE.json, runs more than --tolerance slower than in the baseline report are listed
+# and the exit status is 1.
+
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+from generate_dump import DumpGenerator
+from wikipedia import articles
+
+BENCHMARKS_DIR = os.path.abspath(os.path.dirname(__file__))
+BIN_DIR = os.path.join(BENCHMARKS_DIR, '..', 'bin')
+# logged when apertium.py gives up on its fast path, a run that logs them measures the fallback
+FALLBACK_WARNINGS = [b'misaligned apertium output', b'falling back to a one-shot process']
+
+
+def run(args, env):
+    # (seconds, peak RSS in bytes) of a script in bin/
+    cmd = [sys.executable, os.path.join(BIN_DIR, args[0])] + args[1:]
+    start = time.time()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    err = proc.stderr.read()
+    proc.stderr.close()
+
+    # waited for here rather than by Popen to get its rusage, on Linux ru_maxrss is the largest of the
+    # process and the workers it has waited for
+    _, status, rusage = os.wait4(proc.pid, 0)
+    secs = time.time() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    if proc.returncode != 0:
+        raise RuntimeError("%s failed:\n%s" % (' '.join(cmd), err.decode('utf-8', errors='replace')[-2000:]))
+
+    for warning in FALLBACK_WARNINGS:
+        if warning in err:
+            raise RuntimeError("%s fell back from batched translation (%s), check the fake apertium" %
+                               (' '.join(cmd), warning.decode('utf-8')))
+
+    return secs, rusage.ru_maxrss * 1024
+
+
+def texts_file(dump_fn, fn):
+    # the article texts one per line, the input format of create_synonyms.py
+    with io.open(fn, mode='w', encoding='utf-8') as f:
+        for article in articles(dump_fn):
+            f.write(article['text'].replace('\n', ' ') + '\n')
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-w', '--work-dir', help='dumps and outputs are written here')
+    parser.add_argument('-n', '--articles', default=5000, type=int, help='articles per synthetic dump')
+    parser.add_argument('-v', '--vocabulary', default=50000, type=int)
+    parser.add_argument('-z', '--skew', default=1.1, type=float)
+    parser.add_argument('-f', '--format', default='gz', choices=['gz', 'bz2', 'plain'])
+    parser.add_argument('-p', '--procs', default=[1, 2, 4], type=int, nargs='+')
+    parser.add_argument('-L', '--latency', default=0.0, type=float, help='startup seconds of every apertium call')
+    parser.add_argument('-o', '--output-file', help='JSON report')
+    parser.add_argument('-c', '--compare', help='JSON report of an earlier run to compare against')
+    parser.add_argument('--tolerance', default=0.2, type=float, help='allowed slowdown against the baseline')
+    opts = parser.parse_args()
+
+    if not opts.work_dir:
+        logging.error("missing work directory ...")
+        sys.exit(1)
+
+    if not os.path.isdir(opts.work_dir):
+        os.makedirs(opts.work_dir)
+
+    env = dict(os.environ)
+    env['PATH'] = os.path.join(BENCHMARKS_DIR, 'fake_apertium') + os.pathsep + env.get('PATH', '')
+    env['FAKE_APERTIUM_LATENCY'] = str(opts.latency)
+
+    ext = {'gz': '.json.gz', 'bz2': '.json.bz2', 'plain': '.json'}[opts.format]
+
+    def work(name):
+        return os.path.join(opts.work_dir, name)
+
+    nn_dump, nb_dump = work('nn' + ext), work('nb' + ext)
+
+    for fn, seed in [(nn_dump, 1), (nb_dump, 2)]:
+        logging.info("writing %d articles to %s" % (opts.articles, fn))
+        DumpGenerator(vocabulary=opts.vocabulary, skew=opts.skew, seed=seed).write(fn, opts.articles)
+
+    results = []
+
+    def record(name, procs, secs, rss, input_fns, articles=None):
+        size = sum(os.path.getsize(fn) for fn in input_fns)
+        result = {'name': name, 'procs': procs, 'seconds': secs, 'peak_rss': rss, 'input_bytes': size,
+                  'mb_per_sec': size / 1e6 / secs}
+
+        if articles:
+            result['articles_per_sec'] = articles / secs
+
+        results.append(result)
+
+    filters = ['-n', '5', '-s', '0.5', '-S', '5', '-T', '5']
+
+    for procs in opts.procs:
+        secs, rss = run(['build_dictionary.py', '-i', nn_dump, '-o', work('nn-dict.txt'), '-d', 'nno-nob',
+                         '-p', str(procs)] + filters, env)
+        record('build_dictionary', procs, secs, rss, [nn_dump], opts.articles)
+
+    procs = max(opts.procs)
+    secs, rss = run(['build_dictionary.py', '-i', nb_dump, '-o', work('nb-dict.txt'), '-d', 'nob-nno',
+                     '-p', str(procs)] + filters, env)
+    record('build_dictionary nob-nno', procs, secs, rss, [nb_dump], opts.articles)
+
+    secs, rss = run(['dict_cross_merge.py', '-k', work('nn-dict.txt'), '-m', work('nb-dict.txt'),
+                     '-o', work('merged-dict.txt')], env)
+    record('dict_cross_merge', 1, secs, rss, [work('nn-dict.txt'), work('nb-dict.txt')])
+
+    secs, rss = run(['counts_to_solr.py', '-i', work('merged-dict.txt'), '-o', work('solr-synonyms.txt')], env)
+    record('counts_to_solr', 1, secs, rss, [work('merged-dict.txt')])
+
+    secs, rss = run(['build_synonyms.py', '-n', nn_dump, '-b', nb_dump, '-o', work('synonyms-streamed.txt')], env)
+    record('build_synonyms', 1, secs, rss, [nn_dump, nb_dump], 2 * opts.articles)
+
+    # parallel corpora for create_synonyms.py, translated by the fake apertium outside the timing
+    texts_file(nn_dump, work('nn.txt'))
+    texts_file(nb_dump, work('nb.txt'))
+    subprocess.check_call(['apertium', '-f', 'txt', 'nno-nob', work('nn.txt'), work('nn.nob.txt')], env=env)
+    subprocess.check_call(['apertium', '-f', 'txt', 'nob-nno', work('nb.txt'), work('nb.nno.txt')], env=env)
+
+    for procs in opts.procs:
+        secs, rss = run(['create_synonyms.py', '-p', str(procs), '-l', '1000', work('nn.txt'), work('nn.nob.txt'),
+                         work('nb.nno.txt'), work('nb.txt'), work('synonyms.txt')], env)
+        record('create_synonyms', procs, secs, rss, [work('nn.txt'), work('nb.txt')])
+
+    base_secs = dict((r['procs'], r['seconds']) for r in results if r['name'] == 'build_dictionary')
+
+    print('%-26s %5s %8s %8s %10s %12s %8s' % ('benchmark', 'procs', 'secs', 'MB/s', 'articles/s', 'peak RSS MB',
+                                               'speedup'))
+
+    for r in results:
+        speedup = base_secs[min(base_secs)] / r['seconds'] if r['name'] == 'build_dictionary' else None
+        print('%-26s %5d %8.2f %8.2f %10s %12.1f %8s' %
+              (r['name'], r['procs'], r['seconds'], r['mb_per_sec'],
+               '%.0f' % r['articles_per_sec'] if 'articles_per_sec' in r else '-', r['peak_rss'] / 1e6,
+               '%.2fx' % speedup if speedup else '-'))
+
+    report = {'articles': opts.articles, 'vocabulary': opts.vocabulary, 'skew': opts.skew, 'format': opts.format,
+              'latency': opts.latency, 'results': results}
+
+    if opts.output_file:
+        with io.open(opts.output_file, mode='w', encoding='utf-8') as f:
+            f.write(json.dumps(report, indent=2, sort_keys=True))
+
+    if opts.compare:
+        with io.open(opts.compare, mode='r', encoding='utf-8') as f:
+            baseline = dict(((r['name'], r['procs']), r) for r in json.load(f)['results'])
+
+        regressions = []
+
+        for r in results:
+            old = baseline.get((r['name'], r['procs']))
+
+            if old and r['seconds'] > old['seconds'] * (1.0 + opts.tolerance):
+                regressions.append("%s with %d procs: %.2fs, was %.2fs" %
+                                   (r['name'], r['procs'], r['seconds'], old['seconds']))
+
+        for regression in regressions:
+            logging.error("slower than baseline: %s" % regression)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
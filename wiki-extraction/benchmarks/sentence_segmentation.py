@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+# Checks segmenter.Segmenter against nltk.sent_tokenize() on articles of a dump and times both. Punkt mode
+# must return the same sentences for every article, rules mode reports how many of punkt's sentence
+# boundaries it finds (recall) and how many of its own boundaries punkt agrees with (precision).
+
+import logging
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+from nltk.tokenize import sent_tokenize
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+from segmenter import Segmenter, sentences
+from wikipedia import articles
+
+
+def timed(fn, repeat):
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        start = time.time()
+        result = fn()
+        secs = time.time() - start
+        best = secs if best is None else min(best, secs)
+
+    return result, best
+
+
+def boundaries(all_spans):
+    return set((i, end) for i, spans in enumerate(all_spans) for _, end in spans)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-i', '--input-file')
+    parser.add_argument('-l', '--limit', default=10000, type=int, help='articles read from the dump')
+    parser.add_argument('-r', '--repeat', default=3, type=int)
+    parser.add_argument('-e', '--examples', default=0, type=int, help='rules mode disagreements to print')
+    opts = parser.parse_args()
+
+    if not opts.input_file:
+        logging.error("missing input file ...")
+        sys.exit(1)
+
+    texts = [article['text'] for article in articles(opts.input_file, limit=opts.limit)]
+    size = sum(len(text) for text in texts)
+
+    expected, baseline = timed(lambda: [sent_tokenize(text, language='norwegian') for text in texts], opts.repeat)
+
+    punkt = Segmenter('punkt')
+    punkt_spans, punkt_secs = timed(lambda: punkt.segment(texts), opts.repeat)
+
+    for i, (text, spans) in enumerate(zip(texts, punkt_spans)):
+        if sentences(text, spans) != expected[i]:
+            logging.error("punkt mode differs from sent_tokenize on article %d" % i)
+            sys.exit(1)
+
+    rules = Segmenter('rules')
+    rule_spans, rules_secs = timed(lambda: rules.segment(texts), opts.repeat)
+
+    print('%d articles, %.1f MB, %d sentences' % (len(texts), size / 1e6, sum(len(s) for s in expected)))
+    print('%-16s %8s %10s %8s' % ('segmenter', 'secs', 'MB/s', 'speedup'))
+
+    for name, secs in [('sent_tokenize', baseline), ('punkt', punkt_secs), ('rules', rules_secs)]:
+        print('%-16s %8.2f %10.1f %7.2fx' % (name, secs, size / 1e6 / secs, baseline / secs))
+
+    expected_bounds = boundaries(punkt_spans)
+    rule_bounds = boundaries(rule_spans)
+    agreed = len(expected_bounds & rule_bounds)
+
+    print('rules mode: %.1f%% of articles identical, boundary precision %.3f, recall %.3f' %
+          (100.0 * sum(a == b for a, b in zip(punkt_spans, rule_spans)) / max(len(texts), 1),
+           agreed / float(max(len(rule_bounds), 1)), agreed / float(max(len(expected_bounds), 1))))
+
+    for i, end in sorted(expected_bounds ^ rule_bounds)[:opts.examples]:
+        print('%-6s %r' % ('punkt' if (i, end) in expected_bounds else 'rules', texts[i][max(end - 40, 0):end + 20]))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
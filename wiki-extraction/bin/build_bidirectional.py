@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import io
+import logging
+import os
+import sys
+from argparse import ArgumentParser
+from functools import partial
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+import stats
+from apertium import BATCH_BYTES, configure, flush_cache, package_version, set_cache
+from build_dictionary import batches, count_chunk
+from compact_counter import CompactTranslationCounter
+from pipeline import Pipeline, size_sorted
+from segmenter import set_mode
+from translation_cache import TranslationCache
+from translation_counter import TranslationCounter
+from wikipedia import articles
+
+NN_DIRECTION = 'nno-nob'
+NB_DIRECTION = 'nob-nno'
+
+# counts per direction accumulated in a worker process since its last flush
+_shards = {}
+
+
+def count_tagged(unit, batch_bytes=BATCH_BYTES, flush_docs=10000, counter_cls=TranslationCounter):
+    direction, chunk = unit
+
+    if direction not in _shards:
+        _shards[direction] = counter_cls()
+
+    count_chunk(_shards[direction], chunk, direction, batch_bytes)
+
+    if _shards[direction].count_docs >= flush_docs:
+        return [(direction, _shards.pop(direction))]
+
+    return None
+
+
+def flush_shards():
+    flush_cache()
+    shards = list(_shards.items())
+    _shards.clear()
+
+    return shards or None
+
+
+def tagged(direction, gen):
+    for chunk in gen:
+        yield direction, chunk
+
+
+def interleave(gens):
+    # round robin until all are exhausted, once the smaller dump is read the rest all comes from the other
+    gens = list(gens)
+
+    while gens:
+        for gen in list(gens):
+            item = next(gen, None)
+
+            if item is None:
+                gens.remove(gen)
+            else:
+                yield item
+
+
+def write(counter, fn, format='counts'):
+    with io.open(fn, mode='w', encoding='utf-8') as f:
+        counter.print(f, format=format)
+
+
+def main():
+    parser = ArgumentParser(description='Builds the Nynorsk and Bokmål dictionaries in one run over both dumps, '
+                                        'with one pool of workers translating both directions, and writes the '
+                                        'dictionaries, their cross merge and the solr synonym files. Gives the '
+                                        'same files, byte for byte, as build_dictionary.py twice with the same '
+                                        'filters, dict_cross_merge.py and counts_to_solr.py, with any backend '
+                                        'and number of procs.')
+    parser.add_argument('-p', '--procs', default=1, type=int)
+    parser.add_argument('-N', '--nynorsk-input', help='nnwiki dump, translated nno-nob')
+    parser.add_argument('-B', '--bokmaal-input', help='nowiki dump, translated nob-nno')
+    parser.add_argument('-o', '--output-dir')
+    parser.add_argument('--name', default='top5-filtered',
+                        help='output files are nn-dict-NAME, no-dict-NAME and merged-dict-NAME .txt and .solr')
+    parser.add_argument('-s', '--source-df-filter', default=1.0, type=float)
+    parser.add_argument('-t', '--trans-df-filter', default=1.0, type=float)
+    parser.add_argument('-S', '--source-tf-filter', default=1, type=int)
+    parser.add_argument('-T', '--trans-tf-filter', default=1, type=int)
+    parser.add_argument('-n', '--top-n', default=0, type=int)
+    parser.add_argument('--backend', default='dict', choices=['dict', 'compact'])
+    parser.add_argument('--apertium-timeout', default=60.0, type=float)
+    parser.add_argument('-b', '--batch-bytes', default=BATCH_BYTES, type=int)
+    parser.add_argument('-q', '--queue-depth', default=0, type=int)
+    parser.add_argument('--flush-docs', default=10000, type=int)
+    parser.add_argument('--sort-window', default=1000, type=int)
+    parser.add_argument('--segmenter', default='punkt', choices=['punkt', 'rules'])
+    parser.add_argument('--cache-file')
+    parser.add_argument('--cache-size', default=1024, type=int, help='translation cache size in MB')
+    parser.add_argument('--stats-file')
+    opts = parser.parse_args()
+
+    if not (opts.nynorsk_input and opts.bokmaal_input and opts.output_dir):
+        logging.error("missing filenames...")
+        sys.exit(1)
+
+    if not os.path.isdir(opts.output_dir):
+        os.makedirs(opts.output_dir)
+
+    configure(timeout=opts.apertium_timeout)
+    set_mode(opts.segmenter)
+
+    if opts.cache_file:
+        set_cache(TranslationCache(opts.cache_file, max_bytes=opts.cache_size * 1024 * 1024,
+                                   version=package_version()))
+
+    counter_cls = CompactTranslationCounter if opts.backend == 'compact' else TranslationCounter
+    filters = dict(source_tf_filter=opts.source_tf_filter, source_df_filter=opts.source_df_filter,
+                   trans_tf_filter=opts.trans_tf_filter, trans_df_filter=opts.trans_df_filter, top_n=opts.top_n)
+    counters = {NN_DIRECTION: counter_cls(**filters), NB_DIRECTION: counter_cls(**filters)}
+
+    sources = []
+
+    for direction, fn in [(NN_DIRECTION, opts.nynorsk_input), (NB_DIRECTION, opts.bokmaal_input)]:
+        gen = size_sorted(articles(fn), opts.sort_window, key=lambda article: len(article.get('text', '')))
+        sources.append(tagged(direction, batches(gen, opts.batch_bytes)))
+
+    pipeline = Pipeline(partial(count_tagged, batch_bytes=opts.batch_bytes, flush_docs=opts.flush_docs,
+                                counter_cls=counter_cls),
+                        procs=opts.procs, queue_depth=opts.queue_depth, finish=flush_shards)
+
+    for shards in pipeline.run(interleave(sources)):
+        for direction, shard in shards:
+            with stats.timer('merge'):
+                counters[direction].merge(shard)
+
+        del shards
+
+    def out(prefix, ext):
+        return os.path.join(opts.output_dir, '%s-dict-%s.%s' % (prefix, opts.name, ext))
+
+    with stats.timer('write'):
+        # the filtered dictionaries are what dict_cross_merge.py and counts_to_solr.py read from the text files
+        nn_dict = counters.pop(NN_DIRECTION).filtered()
+        nb_dict = counters.pop(NB_DIRECTION).filtered()
+
+        for prefix, dictionary in [('nn', nn_dict), ('no', nb_dict)]:
+            write(dictionary, out(prefix, 'txt'))
+            write(dictionary, out(prefix, 'solr'), format='solr')
+
+        merged = nn_dict.cross_merge(nb_dict)
+
+        write(merged, out('merged', 'txt'))
+        write(merged, out('merged', 'solr'), format='solr')
+
+    stats.log_report()
+
+    if opts.stats_file:
+        stats.write_report(opts.stats_file, procs=opts.procs)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
@@ -20,35 +20,18 @@ PROCS=`docker run wiki-extraction bash -c "cat /proc/cpuinfo | grep processor |
 
 echo "Using ${PROCS} processors ..."
 
-if [ ! -f ${DATA_DIR}/nn-dict-top5-filtered.txt ]; then
-    echo "Creating NN dictionary"
+MISSING=NO
+
+for NAME in nn-dict no-dict merged-dict; do
+    for EXT in txt solr; do
+        if [ ! -f ${DATA_DIR}/${NAME}-top5-filtered.${EXT} ]; then
+            MISSING=YES
+        fi
+    done
+done
+
+if [ ${MISSING} = YES ]; then
+    echo "Creating NN and NO dictionaries"
     docker run -v `pwd`/${DATA_DIR}:/data wiki-extraction bash -l -c \
-        "build_dictionary.py -p ${PROCS} -d nno-nob -n 5 -s 0.5 -t 5 -i /data/nnwiki-20161017-cirrussearch-content.json.gz -o /data/nn-dict-top5-filtered.txt"
+        "build_bidirectional.py -p ${PROCS} -n 5 -s 0.5 -t 5 -N /data/nnwiki-20161017-cirrussearch-content.json.gz -B /data/nowiki-20161017-cirrussearch-content.json.gz -o /data --name top5-filtered"
 fi
-
-if [ ! -f ${DATA_DIR}/no-dict-top5-filtered.txt ]; then
-    echo "Creating NO dictionary"
-    docker run -v `pwd`/${DATA_DIR}:/data wiki-extraction bash -l -c \
-        "build_dictionary.py -p ${PROCS} -d nob-nno -n 5 -s 0.5 -t 5 -i /data/nowiki-20161017-cirrussearch-content.json.gz -o /data/no-dict-top5-filtered.txt"
-fi
-
-if [ ! -f ${DATA_DIR}/merged-dict-top5-filtered.txt ]; then
-    echo "Merging counts"
-    docker run -v `pwd`/${DATA_DIR}:/data wiki-extraction bash -l -c \
-        "dict_cross_merge.py -k /data/nn-dict-top5-filtered.txt -m /data/no-dict-top5-filtered.txt -o data/merged-dict-top5-filtered.txt"
-fi
-
-if [ !-f ${DATA_DIR}/merged-dict-top5-filtered.solr ]; then
-    docker run -v `pwd`/${DATA_DIR}:/data wiki-extraction bash -l -c \
-        "counts_to_solr.py -i ../data/merged-dict-top5-filtered.txt -o ../data/merged-dict-top5-filtered.solr"
-fi
-
-if [ !-f ${DATA_DIR}/nn-dict-top5-filtered.solr ]; then
-    docker run -v `pwd`/${DATA_DIR}:/data wiki-extraction bash -l -c \
-        "counts_to_solr.py -i ../data/nn-dict-top5-filtered.txt -o ../data/nn-dict-top5-filtered.solr"
-fi
-
-if [ !-f ${DATA_DIR}/no-dict-top5-filtered.solr ]; then
-    docker run -v `pwd`/${DATA_DIR}:/data wiki-extraction bash -l -c \
-        "counts_to_solr.py -i ../data/no-dict-top5-filtered.txt -o ../data/n0-dict-top5-filtered.solr"
-fi
\ No newline at end of file
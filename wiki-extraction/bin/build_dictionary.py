@@ -2,13 +2,11 @@
 
 import io
 import logging
-import multiprocessing
 import os
 import sys
-from argparse import ArgumentParser
-
-from future.moves.itertools import repeat, islice
-from nltk.tokenize import sent_tokenize
+import zlib
+from argparse import ArgumentParser, ArgumentTypeError
+from functools import partial
 
 try:
     # noinspection PyShadowingBuiltins,PyUnresolvedReferences
@@ -18,12 +16,29 @@ except ImportError:
 
 sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
 
-from apertium import translate
+import stats
+from apertium import BATCH_BYTES, BatchTranslator, configure, flush_cache, package_version, set_cache
+from approximate_counter import ApproximateTranslationCounter
+from checkpoint import Checkpoint, CheckpointError
+from compact_counter import CompactTranslationCounter
+from dictionary_file import save
+from dump_ranges import dump_ranges, range_articles
+from external_counter import SpillingTranslationCounter
+from pipeline import Pipeline, size_sorted
+from segmenter import get_segmenter, sentences, set_mode
+from similarity import drift_point, drift_similarity, log_hit_rate, set_drift_check
+from translation_cache import TranslationCache
 from translation_counter import TranslationCounter
-from wikipedia import articles, tokenize
+from vocabulary import Vocabulary
+from wikipedia import articles, is_xml_dump
+
 
+def compare(tokens, trans_tokens, ratios=None):
+    # with the edit distance ratios of the token pairs, the pairs after the alignment has drifted are dropped
+    if ratios is not None:
+        end = drift_point(ratios)
+        tokens, trans_tokens = tokens[:end], trans_tokens[:end]
 
-def compare(tokens, trans_tokens):
     pairs = []
 
     same_len = len(tokens) == len(trans_tokens)
@@ -44,27 +59,169 @@ def compare(tokens, trans_tokens):
     return pairs
 
 
-def article_to_pairs(arg):
-    article, direction = arg
-    pairs = []
+def articles_to_pairs(chunk, direction, batch_bytes=BATCH_BYTES, vocab=None):
+    # pairs of words, or of ids in vocab if one is given
+    texts = [article.get('text', '') for article in chunk]
+
+    with stats.timer('segment'):
+        docs = [sentences(text, spans) for text, spans in zip(texts, get_segmenter().segment(texts))]
+
+    stats.add('sentences', sum(len(sents) for sents in docs))
+
+    with stats.timer('translate'):
+        translations = BatchTranslator(direction, batch_bytes=batch_bytes).translate(docs)
+
+    # sentences are aligned on ids of a vocabulary for this chunk only, just the words that end up
+    # in a pair are passed on
+    chunk_vocab = Vocabulary()
+
+    with stats.timer('tokenize'):
+        tokenized = [[(chunk_vocab.tokenize(sent), chunk_vocab.tokenize(trans))
+                      for sent, trans in zip(sents, trans_sents)]
+                     for sents, trans_sents in zip(docs, translations)]
+
+    results = []
+
+    with stats.timer('align'):
+        similarity = drift_similarity()
+
+        if similarity:
+            sim_ids = similarity.ids(chunk_vocab.words)
+
+        for doc in tokenized:
+            pairs = []
 
-    if 'text' not in article:
-        return []
+            for source_ids, trans_ids in doc:
+                ratios = None
 
-    sents = sent_tokenize(article['text'], language='norwegian')
-    translations = translate(sents, direction)
+                if similarity:
+                    ratios = similarity.ratios([sim_ids[idx] for idx in source_ids],
+                                               [sim_ids[idx] for idx in trans_ids])
 
-    for sent, trans in zip(sents, translations):
-        trans_tokens = tokenize(trans)
-        tokens = tokenize(sent)
+                pairs += compare(source_ids, trans_ids, ratios)
 
-        pairs += compare(tokens, trans_tokens)
+            results.append(pairs)
 
-    del article
-    del sents
+        if similarity:
+            similarity.report_stats()
+
+    del chunk
+    del texts
+    del docs
     del translations
+    del tokenized
 
-    return pairs
+    if vocab is None:
+        words = chunk_vocab.words
+
+        return [[(words[a], words[b]) for a, b in pairs] for pairs in results]
+
+    used = sorted(set(idx for pairs in results for pair in pairs for idx in pair))
+    remap = dict(zip(used, vocab.ids([chunk_vocab.words[idx] for idx in used])))
+
+    return [[(remap[a], remap[b]) for a, b in pairs] for pairs in results]
+
+
+# counts accumulated in a worker process since its last flush
+_shard = None
+
+
+def count_chunk(counter, chunk, direction, batch_bytes=BATCH_BYTES):
+    if isinstance(counter, CompactTranslationCounter):
+        # counted on ids end to end
+        results = articles_to_pairs(chunk, direction, batch_bytes=batch_bytes, vocab=counter.vocab)
+
+        with stats.timer('count'):
+            for pairs in results:
+                counter.update_ids(pairs)
+    else:
+        results = articles_to_pairs(chunk, direction, batch_bytes=batch_bytes)
+
+        with stats.timer('count'):
+            for pairs in results:
+                counter.update(pairs)
+
+
+def _count_chunk(chunk, direction, batch_bytes, counter_cls):
+    global _shard
+
+    if _shard is None:
+        _shard = counter_cls()
+
+    count_chunk(_shard, chunk, direction, batch_bytes)
+
+
+def count_articles(chunk, direction, batch_bytes=BATCH_BYTES, flush_docs=10000, counter_cls=TranslationCounter):
+    _count_chunk(chunk, direction, batch_bytes, counter_cls)
+
+    if _shard.count_docs >= flush_docs:
+        return flush_shard()
+
+    return None
+
+
+def count_range(unit, direction, batch_bytes=BATCH_BYTES, flush_docs=10000, counter_cls=TranslationCounter,
+                sort_window=1000, shard=None):
+    # the worker reads and parses its own part of the dump, only the range is sent to it
+    gen = range_articles(unit)
+
+    if shard:
+        gen = select_shard(gen, *shard)
+
+    gen = size_sorted(gen, sort_window, key=lambda article: len(article['text']))
+
+    for chunk in batches(gen, batch_bytes):
+        _count_chunk(chunk, direction, batch_bytes, counter_cls)
+
+    if _shard is not None and _shard.count_docs >= flush_docs:
+        return flush_shard()
+
+    return None
+
+
+def flush_shard():
+    global _shard
+
+    flush_cache()
+    shard, _shard = _shard, None
+
+    return shard
+
+
+def batches(gen, batch_bytes):
+    batch = []
+    size = 0
+
+    for article in gen:
+        batch.append(article)
+        size += len(article.get('text', ''))
+
+        if size >= batch_bytes:
+            yield batch
+            batch = []
+            size = 0
+
+    if batch:
+        yield batch
+
+
+def shard_spec(value):
+    try:
+        index, count = [int(v) for v in value.split('/')]
+    except ValueError:
+        raise ArgumentTypeError("expected I/N, got %s" % value)
+
+    if not 1 <= index <= count:
+        raise ArgumentTypeError("shard %d is not between 1 and %d" % (index, count))
+
+    return index, count
+
+
+def select_shard(gen, index, count):
+    # by a hash of the article id, the same on every machine and for every dump of the same wiki
+    for article in gen:
+        if zlib.crc32(article['id'].encode('utf-8')) % count == index - 1:
+            yield article
 
 
 def main():
@@ -80,35 +237,225 @@ def main():
     parser.add_argument('-n', '--top-n', default=0, type=int)
     parser.add_argument('-C', '--supress-counts', action='store_true')
     parser.add_argument('-d', '--direction', default='nno-nob')
+    parser.add_argument('-F', '--output-format', default='text', choices=['text', 'binary'])
+    parser.add_argument('--backend', default='dict', choices=['dict', 'compact'],
+                        help='counter implementation, compact uses interned ids and NumPy arrays')
+    parser.add_argument('-M', '--memory-budget', default=0, type=int,
+                        help='MB of counts kept in memory before spilling sorted runs to disk, 0 for no limit')
+    parser.add_argument('--spill-dir', help='directory for spilled runs, defaults to the system temp directory')
+    parser.add_argument('-A', '--approximate', action='store_true',
+                        help='keep tf/df in count-min sketches, memory stays flat at some loss of accuracy. The '
+                             'sketches take a fixed size whatever the input, about 110 MB with the default '
+                             'epsilon and delta')
+    parser.add_argument('--sketch-epsilon', default=2e-6, type=float,
+                        help='tf/df overcount bound as a fraction of the total count, sketch memory shrinks in '
+                             'proportion when it is raised, e.g. for small dumps')
+    parser.add_argument('--sketch-delta', default=0.01, type=float,
+                        help='probability that a tf/df estimate exceeds the epsilon bound')
+    parser.add_argument('--pair-capacity', default=0, type=int,
+                        help='with --approximate, keep only this many most frequent pairs (Space-Saving)')
+    parser.add_argument('--apertium-timeout', default=60.0, type=float)
+    parser.add_argument('-b', '--batch-bytes', default=BATCH_BYTES, type=int,
+                        help='target size of the cross-article batches sent to apertium')
+    parser.add_argument('-q', '--queue-depth', default=0, type=int,
+                        help='batches in flight between pipeline stages, defaults to twice the number of procs')
+    parser.add_argument('--flush-docs', default=10000, type=int,
+                        help='documents counted in a worker before its partial counts are sent to the parent')
+    parser.add_argument('--sort-window', default=1000, type=int,
+                        help='number of articles reordered largest first before batching')
+    parser.add_argument('--segmenter', default='punkt', choices=['punkt', 'rules'],
+                        help='rules splits sentences several times faster than punkt with a list of Norwegian '
+                             'abbreviations, the sentences can differ')
+    parser.add_argument('--drift-check', action='store_true',
+                        help='drop the rest of a sentence after three consecutive token pairs less than 40%% similar, '
+                             'as create_synonyms.py does')
+    parser.add_argument('--cache-file')
+    parser.add_argument('--cache-size', default=1024, type=int, help='translation cache size in MB')
+    parser.add_argument('--checkpoint', help='file the counts and input position are saved to periodically')
+    parser.add_argument('--checkpoint-interval', default=1800.0, type=float, help='seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from --checkpoint if it exists, instead of starting over')
+    parser.add_argument('-R', '--range-bytes', default=0, type=int,
+                        help='let workers read and parse ranges of about this many bytes of the dump themselves, '
+                             'compressed dumps are indexed (gzip recompressed to seekable chunks) on first use')
+    parser.add_argument('--read-procs', default=1, type=int,
+                        help='processes decompressing and parsing a multistream .xml.bz2 dump')
+    parser.add_argument('--stats-file', help='JSON file the time per stage, counts and rates are written to')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='write cProfile output of the main process and of every worker to DIR')
+    parser.add_argument('--shard', type=shard_spec,
+                        help='I/N, count only the I-th of N shards of the articles and write unfiltered counts '
+                             'with tf/df to a binary partial file, see merge_partials.py')
     opts = parser.parse_args()
 
+    if opts.memory_budget and (opts.backend != 'dict' or opts.output_format != 'text'):
+        parser.error("--memory-budget needs the dict backend and text output")
+
+    if opts.approximate and (opts.backend != 'dict' or opts.output_format != 'text' or opts.memory_budget):
+        parser.error("--approximate needs the dict backend and text output, without --memory-budget")
+
+    if opts.shard and (opts.approximate or opts.memory_budget):
+        parser.error("--shard can not be combined with --approximate or --memory-budget")
+
+    if opts.range_bytes and (opts.limit or opts.checkpoint):
+        parser.error("--range-bytes can not be combined with --limit or --checkpoint")
+
+    if is_xml_dump(opts.input_file or '') and (opts.range_bytes or opts.checkpoint):
+        parser.error("XML dumps can not be read with --range-bytes or --checkpoint, use --read-procs")
+
+    if opts.resume and not opts.checkpoint:
+        parser.error("--resume needs --checkpoint")
+
+    if opts.checkpoint and opts.memory_budget:
+        # spilled runs are merged and deleted as the run goes on, an older checkpoint could not refer to them
+        parser.error("--checkpoint can not be combined with --memory-budget")
+
     n_procs = opts.procs
     limit = None if opts.limit == 0 else opts.limit
     wiki_fn = opts.input_file
     out_fn = opts.output_file
     direction = opts.direction
 
-    pool = multiprocessing.Pool(processes=n_procs)
+    if opts.profile and not os.path.isdir(opts.profile):
+        os.makedirs(opts.profile)
+
+    profile = stats.start_profile(opts.profile)
+
+    configure(timeout=opts.apertium_timeout)
+    set_mode(opts.segmenter)
+    set_drift_check(opts.drift_check)
+
+    cache = None
+
+    if opts.cache_file:
+        cache = TranslationCache(opts.cache_file, max_bytes=opts.cache_size * 1024 * 1024,
+                                 version=package_version())
+        set_cache(cache)
+
+    counter_cls = CompactTranslationCounter if opts.backend == 'compact' else TranslationCounter
+
+    filters = dict(source_tf_filter=opts.source_tf_filter, source_df_filter=opts.source_df_filter,
+                   trans_tf_filter=opts.trans_tf_filter, trans_df_filter=opts.trans_df_filter,
+                   top_n=opts.top_n, print_counts=not opts.supress_counts)
+
+    if opts.approximate:
+        # workers still count exactly, their shards are folded into the sketches
+        trans_counter = ApproximateTranslationCounter(epsilon=opts.sketch_epsilon, delta=opts.sketch_delta,
+                                                      pair_capacity=opts.pair_capacity or None, **filters)
+        logging.info("count-min sketches take %.0f MB" % (trans_counter.sketch_bytes() / 1e6))
+    elif opts.memory_budget:
+        trans_counter = SpillingTranslationCounter(opts.memory_budget * 1024 * 1024, spill_dir=opts.spill_dir,
+                                                   **filters)
+    else:
+        trans_counter = counter_cls(**filters)
+
+    checkpoint = None
 
-    trans_counter = TranslationCounter(source_tf_filter=opts.source_tf_filter, source_df_filter=opts.source_df_filter,
-                                       trans_tf_filter=opts.trans_tf_filter, trans_df_filter=opts.trans_df_filter,
-                                       top_n=opts.top_n, print_counts=not opts.supress_counts)
+    if opts.range_bytes:
+        ranges = dump_ranges(wiki_fn, opts.range_bytes)
+
+        logging.info("reading %s in %d ranges" % (wiki_fn, len(ranges)))
+
+        pipeline = Pipeline(partial(count_range, direction=direction, batch_bytes=opts.batch_bytes,
+                                    flush_docs=opts.flush_docs, counter_cls=counter_cls,
+                                    sort_window=opts.sort_window, shard=opts.shard),
+                            procs=n_procs, queue_depth=opts.queue_depth, finish=flush_shard,
+                            profile_dir=opts.profile)
+
+        for shard in pipeline.run(ranges):
+            with stats.timer('merge'):
+                trans_counter.merge(shard)
+
+            del shard
+    else:
+        pipeline = Pipeline(partial(count_articles, direction=direction, batch_bytes=opts.batch_bytes,
+                                    flush_docs=opts.flush_docs, counter_cls=counter_cls),
+                            procs=n_procs, queue_depth=opts.queue_depth, finish=flush_shard,
+                            profile_dir=opts.profile)
+
+        if opts.checkpoint:
+            checkpoint = Checkpoint(opts.checkpoint, wiki_fn, interval=opts.checkpoint_interval)
+
+            if opts.resume:
+                try:
+                    saved_counter = checkpoint.load()
+                except CheckpointError as e:
+                    logging.error(str(e))
+                    sys.exit(1)
+
+                if saved_counter is not None:
+                    # filters only apply when printing, the ones given now win
+                    for name, value in filters.items():
+                        setattr(saved_counter, name, value)
+
+                    trans_counter = saved_counter
+            else:
+                checkpoint.remove()
+
+            if limit:
+                limit = max(limit - checkpoint.articles, 0)
+
+            source = articles(wiki_fn, limit=limit, offset=checkpoint.offset, with_offsets=True)
+
+            if limit == 0 and checkpoint.articles:
+                # the limit was reached before the checkpoint
+                source = iter([])
+        else:
+            source = articles(wiki_fn, limit=limit, procs=opts.read_procs)
+
+        while True:
+            # without a checkpoint the whole input is one segment, with one every segment ends
+            # with all workers drained so the counter matches the input position
+            gen = checkpoint.segment(source) if checkpoint else source
+
+            if opts.shard:
+                gen = select_shard(gen, *opts.shard)
+
+            gen = size_sorted(gen, opts.sort_window, key=lambda article: len(article.get('text', '')))
+            gen = batches(gen, opts.batch_bytes)
+
+            for shard in pipeline.run(gen):
+                with stats.timer('merge'):
+                    trans_counter.merge(shard)
+
+                del shard
+
+            if not checkpoint or checkpoint.done:
+                break
+
+            checkpoint.save(trans_counter)
+
+    with stats.timer('write'):
+        if opts.shard:
+            save(trans_counter, out_fn, raw=True)
+        elif opts.output_format == 'binary':
+            save(trans_counter, out_fn)
+        else:
+            with io.open(out_fn, mode='w', encoding='utf-8') as f:
+                trans_counter.print(f)
 
-    gen = articles(wiki_fn, limit=limit)
+    if opts.memory_budget:
+        trans_counter.close()
 
-    while True:
-        chunk = list(islice(gen, 0, 100))
+    if checkpoint:
+        # the output is complete, a later --resume starts over
+        checkpoint.remove()
 
-        if not chunk:
-            break
+    cache_stats = None
 
-        for pairs in pool.map(article_to_pairs, zip(chunk, repeat(direction))):
-            trans_counter.update(pairs)
+    if cache:
+        cache_stats = cache.stats()
+        lookups = max(cache_stats['hits'] + cache_stats['misses'], 1)
+        logging.info("translation cache: %d entries, %.1f MB, %d hits, %d misses (%.1f%% hit rate)" %
+                     (cache_stats['entries'], cache_stats['bytes'] / (1024.0 * 1024.0), cache_stats['hits'],
+                      cache_stats['misses'], 100.0 * cache_stats['hits'] / lookups))
 
-            del pairs
+    stats.stop_profile(profile, opts.profile, 'main')
+    stats.log_report()
+    log_hit_rate()
 
-    with io.open(out_fn, mode='w', encoding='utf-8') as f:
-        trans_counter.print(f)
+    if opts.stats_file:
+        stats.write_report(opts.stats_file, procs=n_procs, input_file=wiki_fn, translation_cache=cache_stats)
 
 
 if __name__ == '__main__':
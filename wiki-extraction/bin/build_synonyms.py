@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import sys
+import threading
+from argparse import ArgumentParser
+
+try:
+    import queue
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import Queue as queue
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+import stats
+from apertium import BATCH_BYTES, BatchTranslator, configure
+from build_dictionary import batches
+from create_synonyms import parse_lines, write_synonym_dictionary
+from pair_table import PairTable
+from similarity import log_hit_rate
+from vocabulary import Vocabulary
+from wikipedia import articles
+
+NN_DIRECTION = 'nno-nob'
+NB_DIRECTION = 'nob-nno'
+
+
+def translated(fn, direction, batch_bytes, out_queue, stop):
+    # puts (direction, texts, translations) on out_queue, one article per line as create_synonyms.py reads them,
+    # then (direction, None, None)
+    translator = BatchTranslator(direction, batch_bytes=batch_bytes)
+
+    try:
+        for chunk in batches(articles(fn), batch_bytes):
+            texts = [article.get('text', '').replace('\n', ' ') for article in chunk]
+
+            with stats.timer('translate'):
+                parts = translator.translate([[text] for text in texts])
+
+            translations = [part[0] if part else u'' for part in parts]
+
+            while not stop.is_set():
+                try:
+                    out_queue.put((direction, texts, translations), timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+
+            if stop.is_set():
+                return
+
+        out_queue.put((direction, None, None))
+    except Exception as e:
+        # raised again in the counting thread
+        out_queue.put((direction, None, e))
+
+
+def count_dumps(nynorsk_fn, bokmaal_fn, batch_bytes=BATCH_BYTES, queue_depth=4):
+    # both dumps are read and translated at the same time, each direction counted on a vocabulary of its own.
+    # The Bokmål counts are merged into the Nynorsk ones at the end, which gives the same ids as reading the
+    # Nynorsk corpus before the Bokmål one.
+    out_queue = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    counts = {}
+
+    threads = []
+
+    for direction, fn in [(NN_DIRECTION, nynorsk_fn), (NB_DIRECTION, bokmaal_fn)]:
+        counts[direction] = (PairTable(), Vocabulary())
+
+        thread = threading.Thread(target=translated, args=(fn, direction, batch_bytes, out_queue, stop))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    try:
+        running = len(threads)
+
+        while running:
+            with stats.timer('wait_input'):
+                direction, texts, translations = out_queue.get()
+
+            if texts is None:
+                if translations is not None:
+                    raise translations
+
+                running -= 1
+                continue
+
+            table, vocab = counts[direction]
+
+            with stats.timer('parse'):
+                if direction == NN_DIRECTION:
+                    parse_lines(table, vocab, texts, translations)
+                else:
+                    parse_lines(table, vocab, translations, texts)
+
+            stats.add('articles', len(texts))
+            stats.progress()
+    finally:
+        stop.set()
+
+    table, vocab = counts[NN_DIRECTION]
+    nb_table, nb_vocab = counts.pop(NB_DIRECTION)
+
+    with stats.timer('merge'):
+        nb_table.compact()
+        table.merge(nb_table.keys, nb_table.counts, remap=vocab.ids(nb_vocab.words))
+
+    return table, vocab
+
+
+def main():
+    parser = ArgumentParser(description='Builds a synonym dictionary from the Nynorsk and Bokmål wiki dumps, '
+                                        'translating both with apertium as they are read. Gives the same output as '
+                                        'create_synonyms.py on the article texts and their translations, without '
+                                        'writing them to disk.')
+    parser.add_argument('-n', '--nynorsk-input', help='nnwiki dump, translated nno-nob')
+    parser.add_argument('-b', '--bokmaal-input', help='nowiki dump, translated nob-nno')
+    parser.add_argument('-o', '--output-file')
+    parser.add_argument('--batch-bytes', default=BATCH_BYTES, type=int,
+                        help='article text sent to apertium in one request')
+    parser.add_argument('-q', '--queue-depth', default=4, type=int,
+                        help='translated batches waiting to be counted, of both directions together')
+    parser.add_argument('--apertium-timeout', default=60.0, type=float)
+    parser.add_argument('--stats-file')
+    opts = parser.parse_args()
+
+    if not (opts.nynorsk_input and opts.bokmaal_input and opts.output_file):
+        logging.error("missing filenames...")
+        sys.exit(1)
+
+    configure(timeout=opts.apertium_timeout)
+
+    table, vocab = count_dumps(opts.nynorsk_input, opts.bokmaal_input, batch_bytes=opts.batch_bytes,
+                               queue_depth=opts.queue_depth)
+
+    with stats.timer('write'):
+        write_synonym_dictionary(vocab, table, opts.output_file)
+
+    stats.log_report()
+    log_hit_rate()
+
+    if opts.stats_file:
+        stats.write_report(opts.stats_file)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
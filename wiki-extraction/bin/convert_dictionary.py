@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import io
+import logging
+import os
+import sys
+from argparse import ArgumentParser
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+from compact_counter import CompactTranslationCounter
+from dictionary_file import is_binary, load, save
+
+
+def main():
+    parser = ArgumentParser(description='Convert dictionaries between the text counts format and the binary format. '
+                                        'The direction is given by the format of the input file.')
+    parser.add_argument('-i', '--input-file')
+    parser.add_argument('-o', '--output-file')
+    parser.add_argument('-f', '--format', default='counts', choices=['counts', 'solr'],
+                        help='text format written when converting from binary')
+    parser.add_argument('-C', '--supress-counts', action='store_true')
+    opts = parser.parse_args()
+
+    in_fn = opts.input_file
+    out_fn = opts.output_file
+
+    if not (in_fn and out_fn):
+        logging.error("missing filenames...")
+        sys.exit(1)
+
+    if is_binary(in_fn):
+        trans_counter = load(in_fn)
+        trans_counter.print_counts = not opts.supress_counts
+
+        with io.open(out_fn, mode='w', encoding='utf-8') as f:
+            trans_counter.print(f, format=opts.format)
+    else:
+        with io.open(in_fn, mode='r', encoding='utf-8') as f:
+            trans_counter = CompactTranslationCounter.read(f)
+
+        save(trans_counter, out_fn)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
@@ -6,6 +6,8 @@ from argparse import ArgumentParser
 
 sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
 
+from compact_counter import CompactTranslationCounter
+from dictionary_file import read_dictionary
 from translation_counter import TranslationCounter
 
 
@@ -13,8 +15,11 @@ def main():
     parser = ArgumentParser()
     parser.add_argument('-i', '--input-file')
     parser.add_argument('-o', '--output-file')
+    parser.add_argument('-b', '--backend', default='dict', choices=['dict', 'compact'])
     opts = parser.parse_args()
 
+    counter_cls = CompactTranslationCounter if opts.backend == 'compact' else TranslationCounter
+
     in_fn = opts.input_file
     out_fn = opts.output_file
 
@@ -22,8 +27,7 @@ def main():
         logging.error("missing filenames...")
         sys.exit(1)
 
-    with io.open(in_fn, mode='r', encoding='utf-8') as f:
-        trans_counter = TranslationCounter.read(f)
+    trans_counter = read_dictionary(in_fn, counter_cls)
 
     with io.open(out_fn, mode='w', encoding='utf-8') as f:
         trans_counter.print(f, format='solr')
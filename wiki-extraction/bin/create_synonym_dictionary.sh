@@ -45,8 +45,4 @@ then
     exit -1
 fi
 
-jq  .text $NYNORSK | sed 's/\\n/ /g' > /tmp/nynorsk.json.jqed &
-jq  .text $BOKMAAL | sed 's/\\n/ /g' > /tmp/bokmaal.json.jqed
-apertium -f txt nob-nno /tmp/bokmaal.json.jqed /tmp/bokmaal.json.jqed.nynorsk &
-apertium -f txt nno-nob /tmp/nynorsk.json.jqed /tmp/nynorsk.json.jqed.bokmaal
-python /software/bin/create_synonyms.py /tmp/nynorsk.json.jqed /tmp/nynorsk.json.jqed.bokmaal /tmp/bokmaal.json.jqed.nynorsk /tmp/bokmaal.json.jqed $OUTPUT
+python /software/bin/build_synonyms.py -n $NYNORSK -b $BOKMAAL -o $OUTPUT
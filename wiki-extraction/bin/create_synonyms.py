@@ -1,136 +1,190 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import sys
+
+import io
+import logging
+import os
 import re
-from fuzzywuzzy import fuzz
+import sys
+from argparse import ArgumentParser
+from multiprocessing import Pool
 
-def usage():
-    print("usage: create_synonyms.py <nynorsk-input> <bokmål-input> (<nynorsk-input> <bokmål-input>) <output>")
-    print("<nynorsk-input> and <bokmål-input> should be parallel corpora with same number of lines. One or two parallel corpora is supported as input.")
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
 
+import stats
+from pair_table import PairTable
+from similarity import drift_point, get_similarity, log_hit_rate
+from vocabulary import Vocabulary
 
-def get_index_key(word_index_dict, word):
-    if not word.lower() in word_index_dict:
-        word_index_dict[word.lower()] = len(word_index_dict)
-    return word_index_dict[word.lower()]
+_TOKEN = re.compile(r'\w+', re.MULTILINE | re.UNICODE)
+_SHIFT = 32
 
 
-def parse_line(frequency_dict, word_index_dict, nynorsk_line, bokmaal_line):
-    nn_tokenized = re.findall(r'\w+', nynorsk_line,  re.MULTILINE | re.UNICODE)
-    nb_tokenized = re.findall(r'\w+', bokmaal_line,  re.MULTILINE | re.UNICODE)
+def parse_line(table, vocab, nynorsk_line, bokmaal_line):
+    nn_tokenized = _TOKEN.findall(nynorsk_line)
+    nb_tokenized = _TOKEN.findall(bokmaal_line)
 
-    if (len(nn_tokenized) != len(nb_tokenized)):
+    if len(nn_tokenized) != len(nb_tokenized):
         # Drop the whole sentence if it doesn't have the same number of tokens.
         return
 
-    consecutive_skips = 0
-    for i in range(len(nb_tokenized)):
+    # If the edit distance ratio is lower than 40 % for three consecutive words,
+    # we conclude that we have gone astray, and drop the rest of the sentence.
+    similarity = get_similarity()
+    ratios = similarity.ratios(similarity.ids(nn_tokenized), similarity.ids(nb_tokenized))
+    end = drift_point(ratios)
 
-        # If translation fails, the word is prefixed with '*'
-        if '*' in nb_tokenized[i] or '*' in nn_tokenized[i]:
-            continue
+    # If translation fails, the word is prefixed with '*'
+    pairs = [(nn_token, nb_token) for nn_token, nb_token in zip(nn_tokenized[:end], nb_tokenized[:end])
+             if '*' not in nb_token and '*' not in nn_token]
 
-        # If the edit distance ratio is lower than 40 % for three consecutive words,
-        # we conclude that we have gone astray, and drop the rest of the sentence.
-        if (fuzz.ratio(nn_tokenized[i], nb_tokenized[i]) < 40):
-            consecutive_skips += 1
-            if (consecutive_skips == 3):
-                break
-        else:
-            consecutive_skips = 0
+    nn_ids = vocab.ids([nn_token.lower() for nn_token, _ in pairs])
+    nb_ids = vocab.ids([nb_token.lower() for _, nb_token in pairs])
 
-        nn_token_idx = get_index_key(word_index_dict, nn_tokenized[i])
-        nb_token_idx = get_index_key(word_index_dict, nb_tokenized[i])
-        if (nn_token_idx, nb_token_idx) in frequency_dict:
-            frequency_dict[(nn_token_idx, nb_token_idx)] += 1
-        else:
-            frequency_dict[(nn_token_idx, nb_token_idx)] = 1
+    table.add_keys([(nn_idx << _SHIFT) | nb_idx for nn_idx, nb_idx in zip(nn_ids, nb_ids)])
 
 
-def parse_corpora(frequency_dict, word_index_dict, nynorsk, bokmaal):
+def parse_lines(table, vocab, nn_lines, nb_lines):
     line_number = 0
-    with open(nynorsk, 'r') as nn:
-        with open(bokmaal, 'r') as nb:
-            while (True):
-                line_number += 1
-                if line_number % 10000 == 0:
-                    sys.stdout.write("Parsing line number " + str(line_number) + "\n")
-
-                nn_line = nn.readline().decode('utf-8')
-                nb_line = nb.readline().decode('utf-8')
-                if ((nn_line == "" and nb_line != "") or (nn_line != "" and nb_line == "")):
-                    raise Exception("Inconsistent file lengths")
-                elif (nn_line == "" and nb_line == ""):
-                    break
-                else:
-                    nn_sentences = nn_line.split(".")
-                    nb_sentences =  nb_line.split(".")
-                    for i in range(len(nb_sentences)):
-                        if (i >= len(nn_sentences)):
-                            break
-                        else:
-                            parse_line(frequency_dict, word_index_dict, nn_sentences[i], nb_sentences[i])
-
-
-def write_synonym_dictionary(word_index_dict, frequency_dict, output):
-    collapsed_dict = get_collapsed_dictionary(frequency_dict)
-
-    inv_word_index_dict = {v: k for k, v in word_index_dict.items()}
-    
-    with open(output, 'w') as out:
-        for collapsed_dict_item in collapsed_dict:
-            word_and_freq_dict = collapsed_dict[collapsed_dict_item]
-
-            highest_freq = 0.0
-            for word in word_and_freq_dict:
-                if word_and_freq_dict[word] > highest_freq:
-                    highest_freq = word_and_freq_dict[word]
-
-            # Skip all frequencies below 20.
-            if highest_freq < 20:
-                continue
 
-            synonyms = [collapsed_dict_item]
+    for nn_line, nb_line in zip(nn_lines, nb_lines):
+        line_number += 1
 
-            for word in word_and_freq_dict:
-                if word_and_freq_dict[word] > highest_freq * 0.3:
-                    synonyms.append(word)
+        nn_sentences = nn_line.split(".")
+        nb_sentences = nb_line.split(".")
 
-            deduplicated_synonyms = list(set(synonyms))
-            if len(deduplicated_synonyms) < 2:
-                continue
+        for nn_sentence, nb_sentence in zip(nn_sentences, nb_sentences):
+            parse_line(table, vocab, nn_sentence, nb_sentence)
 
-            for i in range(len(deduplicated_synonyms)):
-                out.write(inv_word_index_dict[deduplicated_synonyms[i]].encode('utf-8'))
-                if (i < len(deduplicated_synonyms) - 1):
-                    out.write(",")
-            out.write("\n")
+    get_similarity().report_stats()
 
+    return line_number
 
-def get_collapsed_dictionary(frequency_dict):
-    collapsed_dict = {}
-    for word_pair in frequency_dict.keys():
-        if not word_pair[0] in collapsed_dict:
-            collapsed_dict[word_pair[0]] = {}
 
-        word_idx_dict = collapsed_dict[word_pair[0]]
-        word_idx_dict[word_pair[1]] = frequency_dict[word_pair]
-    return collapsed_dict
+def _open(fn):
+    # lines end at '\n' only, as in the line index
+    return io.open(fn, mode='r', encoding='utf-8', newline='\n')
 
 
-def main():
-    frequency_dict = {}
-    word_index_dict = {}
-    if not (len(sys.argv) == 4 or len(sys.argv) == 6):
-        usage()
-        sys.exit(-1)
+def parse_corpora(table, vocab, nynorsk, bokmaal):
+    with _open(nynorsk) as nn, _open(bokmaal) as nb:
+        n_lines = parse_lines(table, vocab, nn, nb)
+
+        if nn.readline() != "" or nb.readline() != "":
+            raise ValueError("Inconsistent file lengths")
+
+    logging.info("parsed %d lines of %s and %s" % (n_lines, nynorsk, bokmaal))
+
+
+def line_index(fn, range_lines):
+    # byte offsets of every range_lines-th line start, and the number of lines
+    offsets = [0]
+    n_lines = 0
+    pos = 0
+
+    with io.open(fn, mode='rb') as f:
+        for line in f:
+            n_lines += 1
+            pos += len(line)
+
+            if n_lines % range_lines == 0:
+                offsets.append(pos)
+
+    if offsets[-1] != pos:
+        offsets.append(pos)
+
+    return offsets, n_lines
+
+
+def _read_range(fn, start, end):
+    with io.open(fn, mode='rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', newline='\n')
+
 
-    parse_corpora(frequency_dict, word_index_dict, sys.argv[1], sys.argv[2])
-    if len(sys.argv) > 3:
-        parse_corpora(frequency_dict, word_index_dict, sys.argv[3], sys.argv[4])
+def parse_range(unit):
+    # a local frequency table and vocabulary for one range of lines of both corpora
+    nynorsk, nn_start, nn_end, bokmaal, nb_start, nb_end = unit
+    table = PairTable()
+    vocab = Vocabulary()
 
-    write_synonym_dictionary(word_index_dict, frequency_dict, sys.argv[-1])
+    parse_lines(table, vocab, _read_range(nynorsk, nn_start, nn_end), _read_range(bokmaal, nb_start, nb_end))
+
+    table.compact()
+
+    return vocab.words, table.keys, table.counts, stats.take()
+
+
+def parse_corpora_parallel(table, vocab, nynorsk, bokmaal, pool, range_lines):
+    nn_offsets, nn_lines = line_index(nynorsk, range_lines)
+    nb_offsets, nb_lines = line_index(bokmaal, range_lines)
+
+    if nn_lines != nb_lines:
+        raise ValueError("Inconsistent file lengths")
+
+    units = [(nynorsk, nn_start, nn_end, bokmaal, nb_start, nb_end) for nn_start, nn_end, nb_start, nb_end
+             in zip(nn_offsets[:-1], nn_offsets[1:], nb_offsets[:-1], nb_offsets[1:])]
+
+    # merged in input order: words get their ids in the order of first occurrence, as in a serial
+    # run, so the output is the same
+    for words, keys, counts, range_stats in pool.imap(parse_range, units):
+        stats.merge(range_stats)
+        table.merge(keys, counts, remap=vocab.ids(words))
+
+    logging.info("parsed %d lines of %s and %s in %d ranges" % (nn_lines, nynorsk, bokmaal, len(units)))
+
+
+def write_synonym_dictionary(vocab, table, output):
+    # Skip all frequencies below 20, and the translations counted 30 % as often as the most common or less.
+    with io.open(output, mode='w', encoding='utf-8') as out:
+        for nn_idx, nb_ids in table.groups(min_count=20, share=0.3):
+            synonyms = [nn_idx] + [nb_idx for nb_idx in nb_ids if nb_idx != nn_idx]
+
+            if len(synonyms) < 2:
+                continue
+
+            out.write(u','.join(vocab.word(idx) for idx in synonyms) + u'\n')
+
+
+def main():
+    parser = ArgumentParser(description='<nynorsk-input> and <bokmål-input> should be parallel corpora with same '
+                                        'number of lines. One or two parallel corpora is supported as input.')
+    parser.add_argument('files', nargs='+',
+                        metavar='<nynorsk-input> <bokmål-input> (<nynorsk-input> <bokmål-input>) <output>')
+    parser.add_argument('-p', '--procs', default=1, type=int,
+                        help='with more than one, line ranges of the corpora are parsed in parallel')
+    parser.add_argument('-l', '--range-lines', default=20000, type=int, help='lines per range in parallel mode')
+    opts = parser.parse_args()
+
+    if len(opts.files) not in (3, 5):
+        parser.error("expected one or two pairs of parallel corpora and an output file")
+
+    table = PairTable()
+    vocab = Vocabulary()
+    corpora = list(zip(opts.files[0:-1:2], opts.files[1:-1:2]))
+
+    try:
+        if opts.procs > 1:
+            pool = Pool(processes=opts.procs)
+
+            for nynorsk, bokmaal in corpora:
+                parse_corpora_parallel(table, vocab, nynorsk, bokmaal, pool, opts.range_lines)
+
+            pool.close()
+        else:
+            for nynorsk, bokmaal in corpora:
+                parse_corpora(table, vocab, nynorsk, bokmaal)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+    log_hit_rate()
+    write_synonym_dictionary(vocab, table, opts.files[-1])
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+
+    main()
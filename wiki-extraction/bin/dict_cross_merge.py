@@ -8,6 +8,8 @@ from argparse import ArgumentParser
 
 sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
 
+from compact_counter import CompactTranslationCounter
+from dictionary_file import is_binary, read_dictionary, save
 from translation_counter import TranslationCounter
 
 
@@ -16,6 +18,8 @@ def main():
     parser.add_argument('-k', '--key-dictionary')
     parser.add_argument('-m', '--merge-dictionary')
     parser.add_argument('-o', '--output-file')
+    parser.add_argument('-F', '--output-format', default='text', choices=['text', 'binary'])
+    parser.add_argument('-b', '--backend', default='dict', choices=['dict', 'compact'])
     opts = parser.parse_args()
 
     key_fn = opts.key_dictionary
@@ -26,16 +30,22 @@ def main():
         logging.error("Missing input/output files ...")
         sys.exit(1)
 
-    with io.open(key_fn, mode='r', encoding='utf-8') as f:
-        key_counter = TranslationCounter.read(f)
+    # binary dictionaries always open as CompactTranslationCounter, both sides need the same backend
+    if opts.backend == 'compact' or is_binary(key_fn) or is_binary(merge_fn):
+        counter_cls = CompactTranslationCounter
+    else:
+        counter_cls = TranslationCounter
 
-    with io.open(merge_fn, mode='r', encoding='utf-8') as f:
-        merge_counter = TranslationCounter.read(f)
+    key_counter = read_dictionary(key_fn, counter_cls)
+    merge_counter = read_dictionary(merge_fn, counter_cls)
 
     key_counter.cross_merge(merge_counter)
 
-    with io.open(out_fn, mode='w', encoding='utf-8') as f:
-        key_counter.print(f)
+    if opts.output_format == 'binary':
+        save(key_counter, out_fn)
+    else:
+        with io.open(out_fn, mode='w', encoding='utf-8') as f:
+            key_counter.print(f)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import io
+import logging
+import os
+import sys
+from argparse import ArgumentParser
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+from dictionary_file import is_raw, load, save
+from translation_counter import merge_tree
+
+
+def main():
+    parser = ArgumentParser(description='Merges the partial counts written by build_dictionary.py --shard I/N, '
+                                        'then applies the filters and top-n to the merged counts.')
+    parser.add_argument('-i', '--input-files', nargs='+', default=[])
+    parser.add_argument('-o', '--output-file')
+    parser.add_argument('-s', '--source-df-filter', default=1.0, type=float)
+    parser.add_argument('-t', '--trans-df-filter', default=1.0, type=float)
+    parser.add_argument('-S', '--source-tf-filter', default=1, type=int)
+    parser.add_argument('-T', '--trans-tf-filter', default=1, type=int)
+    parser.add_argument('-n', '--top-n', default=0, type=int)
+    parser.add_argument('-C', '--supress-counts', action='store_true')
+    parser.add_argument('-F', '--output-format', default='text', choices=['text', 'binary', 'raw'],
+                        help='raw writes unfiltered counts again, for merging in several steps')
+    opts = parser.parse_args()
+
+    if not (opts.input_files and opts.output_file):
+        logging.error("missing filenames...")
+        sys.exit(1)
+
+    for fn in opts.input_files:
+        if not is_raw(fn):
+            logging.error("%s is not a partial counts file, write it with build_dictionary.py --shard" % fn)
+            sys.exit(1)
+
+    trans_counter = merge_tree(load(fn) for fn in opts.input_files)
+
+    logging.info("merged %d partial files, %d documents" % (len(opts.input_files), trans_counter.count_docs))
+
+    trans_counter.source_tf_filter = opts.source_tf_filter
+    trans_counter.source_df_filter = opts.source_df_filter
+    trans_counter.trans_tf_filter = opts.trans_tf_filter
+    trans_counter.trans_df_filter = opts.trans_df_filter
+    trans_counter.top_n = opts.top_n
+    trans_counter.print_counts = not opts.supress_counts
+
+    if opts.output_format == 'raw':
+        save(trans_counter, opts.output_file, raw=True)
+    elif opts.output_format == 'binary':
+        save(trans_counter, opts.output_file)
+    else:
+        with io.open(opts.output_file, mode='w', encoding='utf-8') as f:
+            trans_counter.print(f)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
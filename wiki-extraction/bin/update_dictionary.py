@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import io
+import logging
+import os
+import sys
+from argparse import ArgumentParser
+from functools import partial
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+from apertium import BATCH_BYTES, configure, flush_cache, package_version, set_cache
+from article_store import ArticleStore, content_hash
+from build_dictionary import articles_to_pairs, batches
+from dictionary_file import save
+from pipeline import Pipeline, size_sorted
+from translation_cache import TranslationCache
+from wikipedia import articles
+
+
+def article_pairs(chunk, direction, batch_bytes=BATCH_BYTES):
+    return [(article['id'], article['hash'], pairs)
+            for article, pairs in zip(chunk, articles_to_pairs(chunk, direction, batch_bytes=batch_bytes))]
+
+
+def changed_articles(gen, hashes, stats):
+    # hashes are popped as articles are seen, what is left afterwards was deleted
+    for article in gen:
+        digest = content_hash(article)
+        old_digest = hashes.pop(article['id'], None)
+
+        if old_digest == digest:
+            stats['unchanged'] += 1
+            continue
+
+        stats['added' if old_digest is None else 'changed'] += 1
+        article['hash'] = digest
+
+        yield article
+
+
+def main():
+    parser = ArgumentParser(description='Builds a dictionary like build_dictionary.py, and keeps every article\'s '
+                                        'contribution to the counts in a store. Run again with a newer dump, only '
+                                        'added, changed and deleted articles are translated.')
+    parser.add_argument('-p', '--procs', default=1, type=int)
+    parser.add_argument('-i', '--input-file')
+    parser.add_argument('-o', '--output-file')
+    parser.add_argument('-a', '--article-store', help='SQLite file with per article counts, created if missing')
+    parser.add_argument('-s', '--source-df-filter', default=1.0, type=float)
+    parser.add_argument('-t', '--trans-df-filter', default=1.0, type=float)
+    parser.add_argument('-S', '--source-tf-filter', default=1, type=int)
+    parser.add_argument('-T', '--trans-tf-filter', default=1, type=int)
+    parser.add_argument('-n', '--top-n', default=0, type=int)
+    parser.add_argument('-C', '--supress-counts', action='store_true')
+    parser.add_argument('-d', '--direction', default='nno-nob')
+    parser.add_argument('-F', '--output-format', default='text', choices=['text', 'binary'])
+    parser.add_argument('--apertium-timeout', default=60.0, type=float)
+    parser.add_argument('-b', '--batch-bytes', default=BATCH_BYTES, type=int)
+    parser.add_argument('-q', '--queue-depth', default=0, type=int)
+    parser.add_argument('--sort-window', default=1000, type=int)
+    parser.add_argument('--cache-file')
+    parser.add_argument('--cache-size', default=1024, type=int, help='translation cache size in MB')
+    opts = parser.parse_args()
+
+    if not (opts.input_file and opts.output_file and opts.article_store):
+        logging.error("missing filenames...")
+        sys.exit(1)
+
+    configure(timeout=opts.apertium_timeout)
+
+    if opts.cache_file:
+        set_cache(TranslationCache(opts.cache_file, max_bytes=opts.cache_size * 1024 * 1024,
+                                   version=package_version()))
+
+    try:
+        store = ArticleStore(opts.article_store, opts.direction)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+    trans_counter = store.counter()
+
+    # filters only apply when printing, the ones given now win
+    trans_counter.source_tf_filter = opts.source_tf_filter
+    trans_counter.source_df_filter = opts.source_df_filter
+    trans_counter.trans_tf_filter = opts.trans_tf_filter
+    trans_counter.trans_df_filter = opts.trans_df_filter
+    trans_counter.top_n = opts.top_n
+    trans_counter.print_counts = not opts.supress_counts
+
+    hashes = store.hashes()
+    stats = {'added': 0, 'changed': 0, 'unchanged': 0}
+
+    logging.info("article store holds %d articles" % len(hashes))
+
+    gen = changed_articles(articles(opts.input_file), hashes, stats)
+    gen = size_sorted(gen, opts.sort_window, key=lambda article: len(article['text']))
+    gen = batches(gen, opts.batch_bytes)
+
+    pipeline = Pipeline(partial(article_pairs, direction=opts.direction, batch_bytes=opts.batch_bytes),
+                        procs=opts.procs, queue_depth=opts.queue_depth, finish=flush_cache)
+
+    for results in pipeline.run(gen):
+        for article_id, digest, pairs in results:
+            trans_counter.subtract(store.pairs(article_id))
+            trans_counter.update(pairs)
+            store.put(article_id, digest, pairs)
+
+    for article_id in hashes:
+        trans_counter.subtract(store.pairs(article_id))
+        store.delete(article_id)
+
+    total = max(stats['added'] + stats['changed'] + stats['unchanged'], 1)
+    logging.info("%d added, %d changed, %d deleted, %d unchanged articles (%.1f%% translated)" %
+                 (stats['added'], stats['changed'], len(hashes), stats['unchanged'],
+                  100.0 * (stats['added'] + stats['changed']) / total))
+
+    store.commit(trans_counter)
+    store.close()
+
+    if opts.output_format == 'binary':
+        save(trans_counter, opts.output_file)
+    else:
+        with io.open(opts.output_file, mode='w', encoding='utf-8') as f:
+            trans_counter.print(f)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
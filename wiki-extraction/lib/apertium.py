@@ -1,17 +1,331 @@
+import atexit
 import logging
+import os
 import re
+import select
 import subprocess
+import threading
 
+try:
+    import queue
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import Queue as queue
 
-def translate(sents, direction):
-    sents = [re.sub(r'\s+', ' ', sent) for sent in sents]
+# seconds without any progress from apertium before a request is considered hung
+TIMEOUT = 60.0
+# attempts on a restarted pipeline before falling back to a one-shot process
+MAX_RETRIES = 2
+# target size in bytes of a cross-article batch sent to apertium in one request
+BATCH_BYTES = 256 * 1024
+# first article separator line, apertium passes numbers through unchanged
+SENTINEL_BASE = 917340000000
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_cache = None
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+class ApertiumError(Exception):
+    pass
+
+
+# a long-lived `apertium -z` process fed NUL-terminated requests
+class ApertiumPipeline():
+    def __init__(self, direction, timeout=TIMEOUT):
+        self.direction = direction
+        self.timeout = timeout
+        self.proc = None
+        self.restarts = -1
+        self._pending = b''
+
+    def start(self):
+        self.close()
+
+        self.proc = subprocess.Popen(['apertium', '-z', self.direction],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.restarts += 1
+        self._pending = b''
+
+        thread = threading.Thread(target=self._log_errors, args=(self.proc.stderr,))
+        thread.daemon = True
+        thread.start()
+
+        return self
+
+    @staticmethod
+    def _log_errors(stream):
+        for line in iter(stream.readline, b''):
+            logging.error("apertium returned error: %s" % line.decode('utf-8', errors='ignore').rstrip())
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def close(self):
+        if self.proc is None:
+            return
+
+        proc, self.proc = self.proc, None
+
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=1.0)
+        except (IOError, OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+
+        proc.stdout.close()
+
+    def translate(self, text):
+        if not self.alive():
+            self.start()
+
+        data = text.encode('utf-8') + b'\0'
+        stdin_fd = self.proc.stdin.fileno()
+        stdout_fd = self.proc.stdout.fileno()
+        os.set_blocking(stdin_fd, False)
+
+        # write and read concurrently so a large request can not deadlock on full pipe buffers
+        output = [self._pending]
+        written = 0
+
+        while True:
+            writers = [stdin_fd] if written < len(data) else []
+            readable, writable, _ = select.select([stdout_fd], writers, [], self.timeout)
+
+            if not readable and not writable:
+                raise ApertiumError("no response from apertium %s in %.1f seconds" % (self.direction, self.timeout))
+
+            if writable:
+                try:
+                    written += os.write(stdin_fd, data[written:written + 65536])
+                except BlockingIOError:
+                    pass
+                except (IOError, OSError) as e:
+                    raise ApertiumError("apertium %s closed its input: %s" % (self.direction, e))
 
+            if readable:
+                chunk = os.read(stdout_fd, 65536)
+
+                if chunk == b'':
+                    raise ApertiumError("apertium %s exited with %s" % (self.direction, self.proc.poll()))
+
+                output.append(chunk)
+
+                if b'\0' in chunk:
+                    break
+
+        result, _, self._pending = b''.join(output).partition(b'\0')
+
+        return result.decode('utf-8')
+
+
+# Pipelines of one direction shared by the threads of a process. Workers translate one batch at a
+# time, so get_pool() keeps a single pipeline per direction.
+class ApertiumPool():
+    def __init__(self, direction, size=1, timeout=TIMEOUT):
+        self.direction = direction
+        self.timeout = timeout
+        self.pipelines = [ApertiumPipeline(direction, timeout=timeout) for _ in range(size)]
+        self.idle = queue.Queue()
+
+        for pipeline in self.pipelines:
+            self.idle.put(pipeline)
+
+    def translate(self, sents):
+        text = u'\n'.join(sents)
+        pipeline = self.idle.get()
+
+        try:
+            for _ in range(MAX_RETRIES + 1):
+                try:
+                    return pipeline.translate(text).split(u'\n')
+                except ApertiumError as e:
+                    logging.warning("%s, restarting" % e)
+                    pipeline.close()
+        finally:
+            self.idle.put(pipeline)
+
+        logging.error("apertium %s keeps failing, falling back to a one-shot process" % self.direction)
+
+        return _translate_once(text, self.direction, self.timeout).split(u'\n')
+
+    def close(self):
+        for pipeline in self.pipelines:
+            pipeline.close()
+
+
+def _translate_once(text, direction, timeout):
     proc = subprocess.Popen(['apertium', direction],
                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-    output, err = proc.communicate(u'\n'.join(sents).encode('utf-8'))
+    try:
+        output, err = proc.communicate(text.encode('utf-8'), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        output, err = proc.communicate()
 
     if len(err) > 0:
         logging.error("apertium returned error: %s" % err.decode('utf-8', errors='ignore'))
 
-    return output.decode('utf-8').split(u'\n')
+    return output.decode('utf-8')
+
+
+def get_pool(direction):
+    global _pools_pid
+
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # forked worker: the parent's pipelines are not ours to use
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        if direction not in _pools:
+            _pools[direction] = ApertiumPool(direction, timeout=TIMEOUT)
+
+        return _pools[direction]
+
+
+def package_version(pair='nno-nob'):
+    try:
+        output = subprocess.check_output(['pkg-config', '--modversion', 'apertium-%s' % pair],
+                                         stderr=subprocess.STDOUT)
+        return output.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def set_cache(cache):
+    global _cache
+
+    _cache = cache
+
+
+def configure(timeout=None):
+    global TIMEOUT
+
+    if timeout is not None:
+        TIMEOUT = timeout
+
+
+@atexit.register
+def close_pools():
+    if _pools_pid == os.getpid():
+        for pool in _pools.values():
+            pool.close()
+
+    _pools.clear()
+
+
+def _is_sentinel(sent):
+    return sent.isdigit() and int(sent) >= SENTINEL_BASE
+
+
+def flush_cache():
+    # the cache writes access times and hit counts in batches, a worker flushes what is left when it is done
+    if _cache is not None:
+        _cache.flush()
+
+
+def translate(sents, direction):
+    sents = [_WHITESPACE_RE.sub(' ', sent).replace(u'\0', u'') for sent in sents]
+
+    if _cache is None:
+        return get_pool(direction).translate(sents)
+
+    # batch sentinels pass through apertium unchanged and are not worth caching
+    cached = [i for i, sent in enumerate(sents) if not _is_sentinel(sent)]
+    translations = list(sents)
+
+    for i, trans in zip(cached, _cache.lookup([sents[i] for i in cached], direction)):
+        translations[i] = trans
+
+    missing = [i for i, trans in enumerate(translations) if trans is None]
+
+    if missing:
+        output = get_pool(direction).translate([sents[i] for i in missing])
+
+        # only output that lines up with the input is cached and put in place, apertium may add a trailing
+        # newline. Otherwise all of the input, sentinels included, is translated again as without a cache,
+        # so a batch fails its sentinel check rather than handing out shifted translations.
+        if len(output) - len(missing) not in (0, 1):
+            return get_pool(direction).translate(sents)
+
+        _cache.store(direction, [(sents[i], trans) for i, trans in zip(missing, output)])
+
+        for i, trans in zip(missing, output):
+            translations[i] = trans
+
+    return [trans if trans is not None else u'' for trans in translations]
+
+
+class BatchTranslator():
+    def __init__(self, direction, batch_bytes=BATCH_BYTES):
+        self.direction = direction
+        self.batch_bytes = batch_bytes
+        self.batches = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _sentinel(seq):
+        return u'%d' % (SENTINEL_BASE + seq)
+
+    def translate(self, docs):
+        results = [None] * len(docs)
+        batch = []
+        size = 0
+
+        for i, sents in enumerate(docs):
+            batch.append(i)
+            size += sum(len(sent) + 1 for sent in sents)
+
+            if size >= self.batch_bytes:
+                self._translate_batch(docs, batch, results)
+                batch = []
+                size = 0
+
+        if batch:
+            self._translate_batch(docs, batch, results)
+
+        return results
+
+    def _translate_batch(self, docs, batch, results):
+        lines = []
+
+        for seq, i in enumerate(batch):
+            lines.append(self._sentinel(seq))
+            lines.extend(docs[i])
+
+        lines.append(self._sentinel(len(batch)))
+
+        parts = self._split(translate(lines, self.direction), [len(docs[i]) for i in batch])
+        self.batches += 1
+
+        if parts is None:
+            logging.warning("misaligned apertium output for a batch of %d articles, translating one by one" %
+                            len(batch))
+            self.fallbacks += 1
+
+            parts = [translate(docs[i], self.direction) if docs[i] else [] for i in batch]
+
+        for i, part in zip(batch, parts):
+            results[i] = part
+
+    def _split(self, output, lengths):
+        parts = []
+        pos = 0
+
+        for seq, length in enumerate(lengths):
+            if pos >= len(output) or output[pos].strip() != self._sentinel(seq):
+                return None
+
+            parts.append(output[pos + 1:pos + 1 + length])
+            pos += 1 + length
+
+        if pos >= len(output) or output[pos].strip() != self._sentinel(len(lengths)):
+            return None
+
+        return parts
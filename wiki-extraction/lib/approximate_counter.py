@@ -0,0 +1,88 @@
+from collections import Counter
+
+from sketch import CountMinSketch, SpaceSaving
+from translation_counter import TranslationCounter
+
+
+# TranslationCounter with tf/df kept in count-min sketches, so their memory does not grow with the
+# long tail of rare tokens. With pair_capacity set the pair counts are kept in a Space-Saving
+# structure holding only the pair_capacity most frequent pairs. Exact TranslationCounter shards can
+# be merged in.
+class ApproximateTranslationCounter(TranslationCounter):
+    def __init__(self, source_tf_filter=1, source_df_filter=1.0, trans_tf_filter=1, trans_df_filter=1.0,
+                 top_n=None, print_counts=True, epsilon=2e-6, delta=0.01, pair_capacity=None):
+        TranslationCounter.__init__(self, source_tf_filter=source_tf_filter, source_df_filter=source_df_filter,
+                                    trans_tf_filter=trans_tf_filter, trans_df_filter=trans_df_filter,
+                                    top_n=top_n, print_counts=print_counts)
+
+        self.source_tf = CountMinSketch(epsilon, delta)
+        self.trans_tf = CountMinSketch(epsilon, delta)
+        self.source_df = CountMinSketch(epsilon, delta)
+        self.trans_df = CountMinSketch(epsilon, delta)
+        self.pairs = SpaceSaving(pair_capacity) if pair_capacity else None
+
+    def sketch_bytes(self):
+        # fixed by epsilon and delta, however little is counted
+        return sum(sketch.table.nbytes for sketch in [self.source_tf, self.trans_tf, self.source_df, self.trans_df])
+
+    def _add_to_map(self, pairs):
+        if self.pairs is None:
+            return TranslationCounter._add_to_map(self, pairs)
+
+        self.pairs.update(pairs)
+
+        return self
+
+    def _sync_pairs(self):
+        if self.pairs is None:
+            return
+
+        self.count_dict = {}
+
+        for (a, b), count in self.pairs.items():
+            if a in self.count_dict:
+                self.count_dict[a][b] = count
+            else:
+                self.count_dict[a] = Counter({b: count})
+
+    # the estimates of all words at once rather than a sketch lookup per word
+    def _passing(self, words, tf, df, tf_filter, df_filter):
+        words = list(words)
+        keep = (tf.estimates(words) >= tf_filter) & (df.estimates(words) / float(self.count_docs) <= df_filter)
+
+        return set(word for word, ok in zip(words, keep.tolist()) if ok)
+
+    # sketches can not list their keys, candidates come from the pair counts
+    def _source_words(self):
+        return self.count_dict.keys()
+
+    def _trans_words(self):
+        return set(trans for counts in self.count_dict.values() for trans in counts)
+
+    def merge(self, other_counter):
+        self.source_tf.update(other_counter.source_tf)
+        self.trans_tf.update(other_counter.trans_tf)
+        self.source_df.update(other_counter.source_df)
+        self.trans_df.update(other_counter.trans_df)
+        self.count_docs += other_counter.count_docs
+
+        if isinstance(other_counter, ApproximateTranslationCounter):
+            other_counter._sync_pairs()
+
+        if self.pairs is None:
+            for key, counter in other_counter.count_dict.items():
+                if key in self.count_dict:
+                    self.count_dict[key].update(counter)
+                else:
+                    self.count_dict[key] = Counter(counter)
+        else:
+            for key, counter in other_counter.count_dict.items():
+                for trans, count in counter.items():
+                    self.pairs.add((key, trans), count)
+
+        return self
+
+    def print(self, f, format='counts'):
+        self._sync_pairs()
+
+        TranslationCounter.print(self, f, format=format)
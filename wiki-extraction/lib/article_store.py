@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import zlib
+from collections import Counter
+
+import dictionary_file
+from compact_counter import _MASK, _SHIFT
+from translation_counter import TranslationCounter
+
+
+def content_hash(article):
+    return hashlib.sha1(u'\0'.join([article['title'], article['text']]).encode('utf-8')).digest()
+
+
+def _encode_pairs(pairs):
+    return sqlite3.Binary(zlib.compress(u'\n'.join(u'%s\t%s' % pair for pair in pairs).encode('utf-8')))
+
+
+def _decode_pairs(blob):
+    text = zlib.decompress(bytes(blob)).decode('utf-8')
+
+    return [tuple(line.split(u'\t')) for line in text.split(u'\n')] if text else []
+
+
+def _from_compact(compact):
+    # TranslationCounter with the counts and tf/df of a raw binary dictionary
+    inst = TranslationCounter()
+    words = list(compact.vocab.words)
+    keys = compact.keys
+
+    for source_id, trans_id, count in zip((keys >> _SHIFT).tolist(), (keys & _MASK).tolist(),
+                                          compact.counts.tolist()):
+        source = words[source_id]
+
+        if source not in inst.count_dict:
+            inst.count_dict[source] = Counter()
+
+        inst.count_dict[source][words[trans_id]] = count
+
+    for name in ['source_tf', 'source_df', 'trans_tf', 'trans_df']:
+        stats = getattr(inst, name)
+
+        for idx, value in enumerate(getattr(compact, name).tolist()):
+            if value:
+                stats[words[idx]] = value
+
+    inst.count_docs = compact.count_docs
+
+    return inst
+
+
+# Per article contributions to a TranslationCounter, so a newer dump only needs the added, changed and
+# deleted articles translated: old contributions are subtracted from the stored counter and new ones
+# added. For each article id the store keeps a hash of its content and the pairs it was counted with.
+# All changes since opening the store are written in one transaction by commit(). The counter is saved
+# next to the store as a raw binary dictionary, FN.counts.GENERATION, and the transaction records the
+# generation: an interrupted update leaves the store and the counter it points to as they were.
+class ArticleStore():
+    def __init__(self, fn, direction):
+        self.fn = fn
+        self.direction = direction
+
+        conn = sqlite3.connect(fn, isolation_level=None)
+        conn.execute('CREATE TABLE IF NOT EXISTS articles '
+                     '(id TEXT PRIMARY KEY, hash BLOB NOT NULL, pairs BLOB NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB NOT NULL)')
+        conn.execute('BEGIN IMMEDIATE')
+
+        stored_direction = self._meta(conn, 'direction')
+
+        if stored_direction is not None and bytes(stored_direction).decode('utf-8') != direction:
+            conn.execute('ROLLBACK')
+            conn.close()
+            raise ValueError("%s holds %s counts, not %s" % (fn, bytes(stored_direction).decode('utf-8'), direction))
+
+        self._conn = conn
+
+    @staticmethod
+    def _meta(conn, name):
+        row = conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+
+        return row[0] if row else None
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+
+    def hashes(self):
+        return {article_id: bytes(digest) for article_id, digest in self._conn.execute('SELECT id, hash FROM articles')}
+
+    def _generation(self):
+        value = self._meta(self._conn, 'generation')
+
+        return int(bytes(value).decode('utf-8')) if value is not None else 0
+
+    def _counts_fn(self, generation):
+        return '%s.counts.%d' % (self.fn, generation)
+
+    def counter(self):
+        generation = self._generation()
+
+        if generation and os.path.exists(self._counts_fn(generation)):
+            return _from_compact(dictionary_file.load(self._counts_fn(generation)))
+
+        counter = TranslationCounter()
+
+        if len(self) > 0:
+            # the counts file went missing
+            logging.warning("no counts saved with %s, counting the stored articles again" % self.fn)
+
+            for (blob,) in self._conn.execute('SELECT pairs FROM articles'):
+                counter.update(_decode_pairs(blob))
+
+        return counter
+
+    def pairs(self, article_id):
+        row = self._conn.execute('SELECT pairs FROM articles WHERE id = ?', (article_id,)).fetchone()
+
+        return _decode_pairs(row[0]) if row else []
+
+    def put(self, article_id, digest, pairs):
+        self._conn.execute('INSERT OR REPLACE INTO articles VALUES (?, ?, ?)',
+                           (article_id, sqlite3.Binary(digest), _encode_pairs(pairs)))
+
+    def delete(self, article_id):
+        self._conn.execute('DELETE FROM articles WHERE id = ?', (article_id,))
+
+    def commit(self, counter):
+        generation = self._generation() + 1
+        dictionary_file.save(counter, self._counts_fn(generation), raw=True)
+
+        self._conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                               [('direction', sqlite3.Binary(self.direction.encode('utf-8'))),
+                                ('generation', sqlite3.Binary(str(generation).encode('utf-8')))])
+        self._conn.execute('COMMIT')
+        self._conn.execute('BEGIN IMMEDIATE')
+
+        if os.path.exists(self._counts_fn(generation - 1)):
+            os.remove(self._counts_fn(generation - 1))
+
+    def close(self):
+        # anything not committed is rolled back
+        self._conn.close()
@@ -0,0 +1,99 @@
+import io
+import logging
+import os
+import pickle
+import time
+
+# bumped when the pickled state changes incompatibly
+VERSION = 1
+
+
+class CheckpointError(Exception):
+    pass
+
+
+# Periodic snapshots of a counter and the position in the input it has counted up to. The input is
+# consumed in segments of at most interval seconds, see segment(). Once a segment is drained the
+# counter holds exactly the articles before offset, so counter and offset are saved together.
+# Offsets are positions in the uncompressed stream: resuming a compressed dump still decompresses
+# up to the offset, but skips parsing, translating and counting.
+class Checkpoint():
+    def __init__(self, fn, input_fn, interval=1800.0):
+        self.fn = fn
+        self.input_fn = input_fn
+        self.interval = interval
+
+        self.offset = 0
+        self.articles = 0
+        self.done = False
+        self.saves = 0
+        self.save_secs = 0.0
+
+        self._started = time.time()
+
+    def _input_id(self):
+        stat = os.stat(self.input_fn)
+
+        return os.path.basename(self.input_fn), stat.st_size
+
+    def segment(self, gen):
+        # gen yields (article, offset after the article), as from articles(..., with_offsets=True)
+        deadline = time.time() + self.interval
+
+        for article, offset in gen:
+            self.offset = offset
+            self.articles += 1
+
+            yield article
+
+            if time.time() >= deadline:
+                return
+
+        self.done = True
+
+    def save(self, counter):
+        start = time.time()
+        tmp_fn = self.fn + '.tmp'
+        state = {'version': VERSION, 'input': self._input_id(), 'offset': self.offset, 'articles': self.articles,
+                 'counter': counter}
+
+        with io.open(tmp_fn, mode='wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_fn, self.fn)
+
+        secs = time.time() - start
+        self.saves += 1
+        self.save_secs += secs
+
+        logging.info("checkpoint %d: %d articles, offset %d, %.1f MB written in %.1fs (%.1f%% of run time so far)" %
+                     (self.saves, self.articles, self.offset, os.path.getsize(self.fn) / (1024.0 * 1024.0), secs,
+                      100.0 * self.save_secs / max(time.time() - self._started, 1e-9)))
+
+    def load(self):
+        # returns the saved counter and restores the position, or None if there is no checkpoint yet
+        if not os.path.exists(self.fn):
+            return None
+
+        with io.open(self.fn, mode='rb') as f:
+            state = pickle.load(f)
+
+        if state.get('version') != VERSION:
+            raise CheckpointError("%s has unsupported checkpoint version %s" % (self.fn, state.get('version')))
+
+        if tuple(state['input']) != self._input_id():
+            raise CheckpointError("%s was written for input %s (%d bytes), not %s" %
+                                  ((self.fn,) + tuple(state['input']) + (self.input_fn,)))
+
+        self.offset = state['offset']
+        self.articles = state['articles']
+
+        logging.info("resuming from %s: %d articles, offset %d" % (self.fn, self.articles, self.offset))
+
+        return state['counter']
+
+    def remove(self):
+        if os.path.exists(self.fn):
+            os.remove(self.fn)
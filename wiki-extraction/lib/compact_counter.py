@@ -0,0 +1,284 @@
+from array import array
+
+import numpy as np
+
+from vocabulary import Vocabulary
+
+# buffered pairs are folded into the sorted count arrays once this many have been added
+COMPACT_EVERY = 1 << 22
+# lines written per call to f.write() in print
+WRITE_BLOCK = 10000
+
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+
+def pack_keys(source_ids, trans_ids):
+    return (np.asarray(source_ids, dtype=np.int64) << _SHIFT) | np.asarray(trans_ids, dtype=np.int64)
+
+
+def _grown(arr, n):
+    if len(arr) >= n and arr.flags.writeable:
+        return arr
+
+    if len(arr) >= n:
+        # read-only view of a mapped file
+        return arr.copy()
+
+    return np.concatenate([arr, np.zeros(n - len(arr), dtype=np.int64)])
+
+
+# Drop-in alternative to TranslationCounter. Tokens are interned to integer ids in a Vocabulary,
+# pair counts are kept as a sorted array of packed (source id << 32 | trans id) keys with a parallel
+# count array, i.e. the indices and data of a CSR matrix, and tf/df are NumPy arrays indexed by id.
+# New pairs are buffered as packed keys and compacted in bulk.
+class CompactTranslationCounter():
+    def __init__(self, source_tf_filter=1, source_df_filter=1.0, trans_tf_filter=1, trans_df_filter=1.0,
+                 top_n=None, print_counts=True):
+        self.source_tf_filter = source_tf_filter
+        self.source_df_filter = source_df_filter
+        self.trans_tf_filter = trans_tf_filter
+        self.trans_df_filter = trans_df_filter
+        self.top_n = top_n
+        self.print_counts = print_counts
+
+        self.vocab = Vocabulary()
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.source_tf = np.zeros(0, dtype=np.int64)
+        self.trans_tf = np.zeros(0, dtype=np.int64)
+        self.source_df = np.zeros(0, dtype=np.int64)
+        self.trans_df = np.zeros(0, dtype=np.int64)
+        self.count_docs = 0
+
+        self._pending = array('q')
+        self._pending_source_df = array('q')
+        self._pending_trans_df = array('q')
+
+    def __len__(self):
+        self._compact()
+
+        return len(self.keys)
+
+    def _compact(self, keys=None, counts=None):
+        n = len(self.vocab)
+
+        self.source_tf = _grown(self.source_tf, n)
+        self.trans_tf = _grown(self.trans_tf, n)
+        self.source_df = _grown(self.source_df, n)
+        self.trans_df = _grown(self.trans_df, n)
+
+        all_keys = [self.keys]
+        all_counts = [self.counts]
+
+        if len(self._pending) > 0:
+            pending = np.frombuffer(self._pending, dtype=np.int64)
+
+            self.source_tf += np.bincount(pending >> _SHIFT, minlength=n)
+            self.trans_tf += np.bincount(pending & _MASK, minlength=n)
+            self.source_df += np.bincount(np.frombuffer(self._pending_source_df, dtype=np.int64), minlength=n)
+            self.trans_df += np.bincount(np.frombuffer(self._pending_trans_df, dtype=np.int64), minlength=n)
+
+            all_keys.append(pending)
+            all_counts.append(np.ones(len(pending), dtype=np.int64))
+
+            self._pending = array('q')
+            self._pending_source_df = array('q')
+            self._pending_trans_df = array('q')
+
+        if keys is not None:
+            all_keys.append(keys)
+            all_counts.append(np.asarray(counts, dtype=np.int64))
+
+        if len(all_keys) == 1:
+            return self
+
+        keys = np.concatenate(all_keys)
+        counts = np.concatenate(all_counts)
+
+        if len(keys) == 0:
+            return self
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        counts = counts[order]
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self.keys = keys[starts]
+        self.counts = np.add.reduceat(counts, starts)
+
+        return self
+
+    def _format(self, word, count):
+        if self.print_counts:
+            return '%s:%d' % (word, count)
+        else:
+            return word
+
+    def update(self, pairs):
+        if len(pairs) == 0:
+            return self
+
+        return self.update_ids(list(zip(self.vocab.ids([a for a, _ in pairs]), self.vocab.ids([b for _, b in pairs]))))
+
+    # update() with pairs of ids in self.vocab, as from Vocabulary.tokenize
+    def update_ids(self, pairs):
+        if len(pairs) == 0:
+            return self
+
+        self.count_docs += 1
+
+        source_ids = [a for a, _ in pairs]
+        trans_ids = [b for _, b in pairs]
+
+        self._pending.extend([(a << _SHIFT) | b for a, b in zip(source_ids, trans_ids)])
+        self._pending_source_df.extend(set(source_ids))
+        self._pending_trans_df.extend(set(trans_ids))
+
+        if len(self._pending) >= COMPACT_EVERY:
+            self._compact()
+
+        return self
+
+    def merge(self, other_counter):
+        other_counter._compact()
+        remap = self.vocab.merge(other_counter.vocab)
+
+        self._compact(pack_keys(remap[other_counter.keys >> _SHIFT], remap[other_counter.keys & _MASK]),
+                      other_counter.counts)
+
+        self.source_tf[remap] += other_counter.source_tf
+        self.trans_tf[remap] += other_counter.trans_tf
+        self.source_df[remap] += other_counter.source_df
+        self.trans_df[remap] += other_counter.trans_df
+        self.count_docs += other_counter.count_docs
+
+        return self
+
+    def cross_merge(self, other_counter):
+        other_counter._compact()
+        remap = self.vocab.merge(other_counter.vocab)
+
+        self._compact(pack_keys(remap[other_counter.keys & _MASK], remap[other_counter.keys >> _SHIFT]),
+                      other_counter.counts)
+
+        return self
+
+    def _word_rank(self):
+        words = self.vocab.words
+        word_rank = np.zeros(len(words), dtype=np.int64)
+        word_rank[sorted(range(len(words)), key=words.__getitem__)] = np.arange(len(words))
+
+        return word_rank
+
+    def _selected(self):
+        self._compact()
+
+        source_ids = self.keys >> _SHIFT
+        trans_ids = self.keys & _MASK
+        counts = self.counts
+
+        if self.count_docs > 0:
+            docs = float(self.count_docs)
+            source_ok = (self.source_tf >= self.source_tf_filter) & (self.source_df / docs <= self.source_df_filter)
+            trans_ok = (self.trans_tf >= self.trans_tf_filter) & (self.trans_df / docs <= self.trans_df_filter)
+
+            keep = source_ok[source_ids] & trans_ok[trans_ids]
+            source_ids, trans_ids, counts = source_ids[keep], trans_ids[keep], counts[keep]
+        # else no tf/df counts - dictionary read from file
+
+        # sources in word order and each source's translations by descending count, ties in word order, so
+        # the output does not depend on the order words were interned in
+        word_rank = self._word_rank()
+        order = np.lexsort((word_rank[trans_ids], -counts, word_rank[source_ids]))
+        source_ids, trans_ids, counts = source_ids[order], trans_ids[order], counts[order]
+
+        if self.top_n:
+            starts = np.flatnonzero(np.r_[True, source_ids[1:] != source_ids[:-1]])
+            rank = np.arange(len(source_ids)) - np.repeat(starts, np.diff(np.r_[starts, len(source_ids)]))
+
+            keep = rank < self.top_n
+            source_ids, trans_ids, counts = source_ids[keep], trans_ids[keep], counts[keep]
+
+        return source_ids, trans_ids, counts
+
+    def print(self, f, format='counts'):
+        source_ids, trans_ids, counts = self._selected()
+
+        if len(source_ids) == 0:
+            return
+
+        starts = np.flatnonzero(np.r_[True, source_ids[1:] != source_ids[:-1]])
+        bounds = np.r_[starts, len(source_ids)].tolist()
+        keys = source_ids[starts].tolist()
+        trans_ids = trans_ids.tolist()
+        counts = counts.tolist()
+        words = self.vocab.words
+
+        lines = []
+
+        for key, start, end in zip(keys, bounds[:-1], bounds[1:]):
+            if format == 'counts':
+                lines.append(u'%s\t%s\n' % (words[key], ' '.join([self._format(words[v], c) for v, c
+                                                                  in zip(trans_ids[start:end], counts[start:end])])))
+            elif format == 'solr':
+                lines.append(u'%s => %s\n' % (words[key], words[trans_ids[start]]))
+
+            if len(lines) >= WRITE_BLOCK:
+                f.write(u''.join(lines))
+                lines = []
+
+        f.write(u''.join(lines))
+
+    # the dictionary print() writes, as the counter read() would return for it: words are interned in
+    # the order read() meets them, so printing gives the same order
+    def filtered(self):
+        source_ids, trans_ids, counts = self._selected()
+        inst = CompactTranslationCounter()
+
+        if len(source_ids) == 0:
+            return inst
+
+        is_start = np.r_[True, source_ids[1:] != source_ids[:-1]]
+        trans_pos = np.arange(len(trans_ids)) + np.cumsum(is_start)
+        seq = np.empty(len(trans_ids) + int(is_start.sum()), dtype=np.int64)
+        seq[trans_pos] = trans_ids
+        seq[trans_pos[is_start] - 1] = source_ids[is_start]
+
+        _, first = np.unique(seq, return_index=True)
+        old_ids = seq[np.sort(first)]
+        new_ids = np.zeros(len(self.vocab), dtype=np.int64)
+        new_ids[old_ids] = np.arange(len(old_ids))
+
+        words = self.vocab.words
+        inst.vocab = Vocabulary([words[idx] for idx in old_ids.tolist()])
+
+        return inst._compact(pack_keys(new_ids[source_ids], new_ids[trans_ids]), counts)
+
+    @staticmethod
+    def read(f):
+        inst = CompactTranslationCounter()
+        vocab_id = inst.vocab.id
+        source_ids = array('q')
+        trans_ids = array('q')
+        counts = array('q')
+
+        for line in f:
+            line = line.strip()
+
+            if line == "":
+                continue
+
+            key, items = line.split('\t')
+            key_id = vocab_id(key)
+
+            for item in items.split():
+                trans, count = item.rsplit(':', 1)
+
+                source_ids.append(key_id)
+                trans_ids.append(vocab_id(trans))
+                counts.append(int(count))
+
+        return inst._compact(pack_keys(np.frombuffer(source_ids, dtype=np.int64),
+                                       np.frombuffer(trans_ids, dtype=np.int64)),
+                             np.frombuffer(counts, dtype=np.int64))
@@ -0,0 +1,181 @@
+import io
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from compact_counter import CompactTranslationCounter, pack_keys
+from vocabulary import MappedVocabulary, StringTable
+
+# Binary dictionary layout, all integers little endian and every section 8 byte aligned:
+#
+#   header         magic, format version, flags, count_docs, number of words, number of entries
+#   word offsets   uint64[words + 1]
+#   word blob      utf-8 strings back to back
+#   keys           int64[entries], packed (source id << 32 | trans id), sorted
+#   counts         int64[entries]
+#   stats          int64[words] each of source_tf, source_df, trans_tf, trans_df, if FLAG_STATS is set
+MAGIC = b'SAMNDICT'
+VERSION = 1
+FLAG_STATS = 1
+
+_HEADER = struct.Struct('<8sIIQQQ')
+
+
+def _pad(n):
+    return (8 - n % 8) % 8
+
+
+def is_binary(fn):
+    with io.open(fn, mode='rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# raw files keep unfiltered counts with tf/df, and can be merged before filtering
+def is_raw(fn):
+    with io.open(fn, mode='rb') as f:
+        header = f.read(_HEADER.size)
+
+    if len(header) < _HEADER.size:
+        return False
+
+    magic, _, flags, _, _, _ = _HEADER.unpack(header)
+
+    return magic == MAGIC and bool(flags & FLAG_STATS)
+
+
+def to_compact(counter):
+    if isinstance(counter, CompactTranslationCounter):
+        return counter
+
+    # dict backed TranslationCounter
+    inst = CompactTranslationCounter(source_tf_filter=counter.source_tf_filter,
+                                     source_df_filter=counter.source_df_filter,
+                                     trans_tf_filter=counter.trans_tf_filter, trans_df_filter=counter.trans_df_filter,
+                                     top_n=counter.top_n, print_counts=counter.print_counts)
+    vocab_id = inst.vocab.id
+    source_ids = []
+    trans_ids = []
+    counts = []
+
+    for key, trans_counts in counter.count_dict.items():
+        key_id = vocab_id(key)
+
+        for trans, count in trans_counts.items():
+            source_ids.append(key_id)
+            trans_ids.append(vocab_id(trans))
+            counts.append(count)
+
+    for stats in [counter.source_tf, counter.trans_tf]:
+        inst.vocab.ids(stats.keys())
+
+    inst._compact(pack_keys(source_ids, trans_ids), counts)
+
+    for name in ['source_tf', 'source_df', 'trans_tf', 'trans_df']:
+        stats = getattr(counter, name)
+        arr = getattr(inst, name)
+        arr[inst.vocab.ids(stats.keys())] = list(stats.values())
+
+    inst.count_docs = counter.count_docs
+
+    return inst
+
+
+def save(counter, fn, raw=False):
+    counter = to_compact(counter)
+
+    if raw:
+        counter._compact()
+        words = counter.vocab.words
+        keys = counter.keys
+        counts = counter.counts
+        stats = [counter.source_tf, counter.source_df, counter.trans_tf, counter.trans_df]
+        count_docs = counter.count_docs
+    else:
+        # what print() would write: filtered, top-n, without tf/df
+        source_ids, trans_ids, counts = counter._selected()
+        used = np.unique(np.concatenate([source_ids, trans_ids]))
+        words = [counter.vocab.words[idx] for idx in used.tolist()]
+
+        keys = pack_keys(np.searchsorted(used, source_ids), np.searchsorted(used, trans_ids))
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        counts = counts[order]
+        stats = None
+        count_docs = 0
+
+    blobs = [word.encode('utf-8') for word in words]
+    offsets = np.zeros(len(blobs) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(blob) for blob in blobs])
+    blob = b''.join(blobs)
+
+    tmp_fn = fn + '.tmp'
+
+    with io.open(tmp_fn, mode='wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, FLAG_STATS if stats is not None else 0,
+                             count_docs, len(blobs), len(keys)))
+        f.write(b'\0' * _pad(_HEADER.size))
+        f.write(offsets.tobytes())
+        f.write(blob)
+        f.write(b'\0' * _pad(len(blob)))
+        f.write(np.asarray(keys, dtype='<i8').tobytes())
+        f.write(np.asarray(counts, dtype='<i8').tobytes())
+
+        if stats is not None:
+            for arr in stats:
+                f.write(np.asarray(arr[:len(blobs)], dtype='<i8').tobytes())
+
+    os.replace(tmp_fn, fn)
+
+
+# Opens a binary dictionary in constant time, the returned counter's arrays are views of the mapped file.
+def load(fn):
+    with io.open(fn, mode='rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, flags, count_docs, n_words, n_entries = _HEADER.unpack_from(buf, 0)
+
+    if magic != MAGIC:
+        raise ValueError("%s is not a binary dictionary" % fn)
+
+    if version != VERSION:
+        raise ValueError("%s has unsupported dictionary format version %d" % (fn, version))
+
+    pos = _HEADER.size + _pad(_HEADER.size)
+
+    def section(dtype, count):
+        nonlocal pos
+
+        arr = np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+        pos += arr.nbytes + _pad(arr.nbytes)
+
+        return arr
+
+    offsets = section('<u8', n_words + 1)
+    blob = section(np.uint8, int(offsets[-1]))
+
+    inst = CompactTranslationCounter()
+    inst.vocab = MappedVocabulary(StringTable(offsets, blob))
+    inst.keys = section('<i8', n_entries)
+    inst.counts = section('<i8', n_entries)
+    inst.count_docs = count_docs
+
+    if flags & FLAG_STATS:
+        inst.source_tf = section('<i8', n_words)
+        inst.source_df = section('<i8', n_words)
+        inst.trans_tf = section('<i8', n_words)
+        inst.trans_df = section('<i8', n_words)
+    else:
+        for name in ['source_tf', 'source_df', 'trans_tf', 'trans_df']:
+            setattr(inst, name, np.zeros(n_words, dtype=np.int64))
+
+    return inst
+
+
+def read_dictionary(fn, counter_cls=CompactTranslationCounter):
+    if is_binary(fn):
+        return load(fn)
+
+    with io.open(fn, mode='r', encoding='utf-8') as f:
+        return counter_cls.read(f)
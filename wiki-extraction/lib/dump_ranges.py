@@ -0,0 +1,278 @@
+import bz2
+import gzip
+import io
+import json
+import logging
+import os
+import zlib
+
+import stats
+from wikipedia import parse_page
+
+# bumped when the index file changes incompatibly
+INDEX_VERSION = 1
+# uncompressed bytes per gzip member when a dump is recompressed to seekable chunks
+CHUNK_BYTES = 16 * 1024 * 1024
+# compressed bytes read per call while scanning or inflating
+READ_BYTES = 1024 * 1024
+
+_BZ2_STREAM = b'\x31\x41\x59\x26\x53\x59'
+_ACTION = b'{"index"'
+
+
+def _format(fn):
+    _, ext = os.path.splitext(fn)
+
+    return {'.gz': 'gz', '.bz2': 'bz2'}.get(ext, 'plain')
+
+
+def _source_id(fn):
+    stat = os.stat(fn)
+
+    return [os.path.basename(fn), stat.st_size, int(stat.st_mtime)]
+
+
+def bz2_streams(fn):
+    # a stream starts with 'BZh', the block size digit and the block magic, 10 bytes that do not occur
+    # byte aligned inside compressed data in practice
+    offsets = []
+    pos = 0
+    tail = b''
+
+    with io.open(fn, mode='rb') as f:
+        while True:
+            block = f.read(READ_BYTES)
+
+            if not block:
+                break
+
+            data = tail + block
+            base = pos - len(tail)
+            i = data.find(b'BZh')
+
+            while i != -1 and i + 10 <= len(data):
+                if data[i + 3:i + 4].isdigit() and data[i + 4:i + 10] == _BZ2_STREAM:
+                    offsets.append(base + i)
+
+                i = data.find(b'BZh', i + 1)
+
+            pos += len(block)
+            tail = data[-9:]
+
+    return offsets
+
+
+def _recompress(fn, chunked_fn):
+    # rewrites a dump as a multi member gzip, every member starting with an action line.
+    # The result is still a valid gzip file, but can be read from any member offset.
+    offsets = []
+    reader = bz2.BZ2File(fn, mode='r') if _format(fn) == 'bz2' else gzip.GzipFile(fn, mode='r')
+
+    with io.open(chunked_fn + '.tmp', mode='wb') as out:
+        lines = []
+        size = 0
+
+        def flush():
+            offsets.append(out.tell())
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            out.write(compressor.compress(b''.join(lines)))
+            out.write(compressor.flush())
+
+        for line in reader:
+            if size >= CHUNK_BYTES and line.startswith(_ACTION):
+                flush()
+                lines = []
+                size = 0
+
+            lines.append(line)
+            size += len(line)
+
+        if lines:
+            flush()
+
+    reader.close()
+    os.replace(chunked_fn + '.tmp', chunked_fn)
+
+    return offsets
+
+
+def build_index(fn, index_fn=None):
+    index_fn = index_fn or fn + '.idx'
+    fmt = _format(fn)
+
+    if os.path.exists(index_fn):
+        with io.open(index_fn, mode='r', encoding='utf-8') as f:
+            index = json.load(f)
+
+        if index.get('version') == INDEX_VERSION and index['source'] == _source_id(fn) and \
+                os.path.exists(index['data']):
+            return index
+
+    data_fn = fn
+    offsets = bz2_streams(fn) if fmt == 'bz2' else []
+
+    if fmt == 'gz' or (fmt == 'bz2' and len(offsets) < 2):
+        # single stream bz2 or gzip, one pass to recompress into seekable members
+        data_fn = os.path.splitext(fn)[0] + '.chunked.gz'
+
+        logging.info("recompressing %s to seekable chunks in %s" % (fn, data_fn))
+
+        offsets = _recompress(fn, data_fn)
+        fmt = 'gz'
+
+    index = {'version': INDEX_VERSION, 'source': _source_id(fn), 'data': os.path.abspath(data_fn), 'format': fmt,
+             'offsets': offsets, 'size': os.path.getsize(data_fn)}
+
+    with io.open(index_fn + '.tmp', mode='w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+    os.replace(index_fn + '.tmp', index_fn)
+
+    return index
+
+
+# Splits a dump into byte ranges that can be read independently, as (data file, format, start, end).
+# Compressed dumps are split at stream/member boundaries from an index that is built on first use,
+# see build_index(). Ranges need not be aligned with records, see range_articles().
+def dump_ranges(fn, range_bytes, index_fn=None):
+    if _format(fn) == 'plain':
+        size = os.path.getsize(fn)
+        bounds = list(range(0, size, range_bytes))
+        data_fn = fn
+        fmt = 'plain'
+    else:
+        index = build_index(fn, index_fn)
+        size = index['size']
+        data_fn = index['data']
+        fmt = index['format']
+        bounds = [0]
+
+        for offset in index['offsets']:
+            if not bounds or offset - bounds[-1] >= range_bytes:
+                bounds.append(offset)
+
+    bounds = [b for b in bounds if b < size] or [0]
+
+    return [(data_fn, fmt, start, end) for start, end in zip(bounds, bounds[1:] + [size])]
+
+
+def inflate(f, fmt, start, end):
+    # decompressed data of the compressed bytes [start, end), which must start at a stream/member boundary
+    f.seek(start)
+    pos = start
+    decompressor = None
+
+    while pos < end:
+        data = f.read(min(READ_BYTES, end - pos))
+
+        if not data:
+            break
+
+        pos += len(data)
+
+        if fmt == 'plain':
+            yield data
+            continue
+
+        while data:
+            if decompressor is None:
+                decompressor = bz2.BZ2Decompressor() if fmt == 'bz2' else zlib.decompressobj(31)
+
+            out = decompressor.decompress(data)
+
+            if out:
+                yield out
+
+            if not decompressor.eof:
+                break
+
+            data = decompressor.unused_data
+            decompressor = None
+
+
+def _timed(chunks):
+    # time spent reading and decompressing, not in the consumer
+    while True:
+        with stats.timer('read'):
+            data = next(chunks, None)
+
+        if data is None:
+            return
+
+        yield data
+
+
+def _lines(chunks):
+    # (uncompressed offset, line) for the lines in a stream of byte chunks
+    pos = 0
+    rest = b''
+
+    for chunk in chunks:
+        data = rest + chunk
+        start = 0
+
+        while True:
+            end = data.find(b'\n', start)
+
+            if end == -1:
+                break
+
+            yield pos, data[start:end + 1]
+            pos += end + 1 - start
+            start = end + 1
+
+        rest = data[start:]
+
+    if rest:
+        yield pos, rest
+
+
+# Articles whose action line starts in the uncompressed data of a range. Like Hadoop's line record
+# reader, a range other than the first skips its first line, which belongs to the previous range even
+# when it starts exactly at the boundary, and a range reads on into the next one to finish its last
+# record. Every record is read by exactly one range.
+def range_articles(unit):
+    data_fn, fmt, start, end = unit
+    own_bytes = [None]
+
+    with io.open(data_fn, mode='rb') as f:
+        size = os.fstat(f.fileno()).st_size
+
+        def chunks():
+            n = 0
+
+            for data in _timed(inflate(f, fmt, start, end)):
+                n += len(data)
+                yield data
+
+            own_bytes[0] = n
+
+            for data in _timed(inflate(f, fmt, end, size)):
+                yield data
+
+        lines = _lines(chunks())
+
+        if start > 0:
+            next(lines, None)
+
+        for pos, line in lines:
+            if own_bytes[0] is not None and pos > own_bytes[0]:
+                return
+
+            if not line.startswith(_ACTION):
+                continue
+
+            source_line = next(lines, None)
+
+            if source_line is None:
+                return
+
+            with stats.timer('parse'):
+                article = parse_page(line, source_line[1])
+
+            stats.add('bytes', len(line) + len(source_line[1]))
+
+            if article is not None:
+                stats.add('articles')
+
+                yield article
@@ -0,0 +1,280 @@
+import heapq
+import io
+import logging
+import os
+import shutil
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+from translation_counter import TranslationCounter, WRITE_BLOCK, rank
+
+# rough memory use of one pair or tf/df entry in a TranslationCounter, including its share of the strings
+ENTRY_BYTES = 200
+# sorted runs merged in one go before runs are merged down to a single run
+MAX_RUNS = 64
+# records sorted in memory per run when re-sorting filtered pairs by source
+RUN_RECORDS = 1000000
+
+
+def _read_run(fn, n_keys):
+    with io.open(fn, mode='r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip(u'\n').split(u'\t')
+
+            yield tuple(fields[:n_keys]), [int(v) for v in fields[n_keys:]]
+
+
+def _write_run(fn, records):
+    with io.open(fn, mode='w', encoding='utf-8') as f:
+        lines = []
+
+        for key, values in records:
+            lines.append(u'\t'.join(list(key) + [str(v) for v in values]) + u'\n')
+
+            if len(lines) >= WRITE_BLOCK:
+                f.write(u''.join(lines))
+                lines = []
+
+        f.write(u''.join(lines))
+
+
+def _popped_pairs(by_trans):
+    for trans in sorted(by_trans):
+        counts = by_trans.pop(trans)
+
+        for source in sorted(counts):
+            yield (trans, source), [counts[source]]
+
+
+def _popped_stats(counter):
+    for token in sorted(set(counter.source_tf) | set(counter.trans_tf)):
+        yield (token,), [counter.source_tf.pop(token, 0), counter.source_df.pop(token, 0),
+                         counter.trans_tf.pop(token, 0), counter.trans_df.pop(token, 0)]
+
+
+def _merge_sum(runs):
+    current_key = None
+    current = None
+
+    for key, values in heapq.merge(*runs, key=itemgetter(0)):
+        if key == current_key:
+            current = [a + b for a, b in zip(current, values)]
+        else:
+            if current_key is not None:
+                yield current_key, current
+
+            current_key, current = key, values
+
+    if current_key is not None:
+        yield current_key, current
+
+
+def _with_stats(items, stats, token_of):
+    # merge join of items and (token,), [source_tf, source_df, trans_tf, trans_df] records, both sorted by token
+    stats = iter(stats)
+    token = None
+    values = None
+
+    for item in items:
+        item_token = token_of(item)
+
+        while token is None or token < item_token:
+            record = next(stats, None)
+
+            if record is None:
+                break
+
+            (token,), values = record
+
+        yield item, values if token == item_token else None
+
+
+# TranslationCounter that keeps memory use below a budget. When the estimated size of the in-memory
+# counter exceeds the budget, its pairs are written to disk as a run sorted by (translation, source)
+# and its tf/df as a run sorted by token. print() merges the runs: a first pass applies the
+# translation filters while streaming pairs by translation and re-sorts the survivors by source in
+# bounded runs, a second pass applies the source filters and top-n one source at a time.
+class SpillingTranslationCounter():
+    def __init__(self, memory_budget, spill_dir=None, source_tf_filter=1, source_df_filter=1.0, trans_tf_filter=1,
+                 trans_df_filter=1.0, top_n=None, print_counts=True):
+        self.memory_budget = memory_budget
+        self.source_tf_filter = source_tf_filter
+        self.source_df_filter = source_df_filter
+        self.trans_tf_filter = trans_tf_filter
+        self.trans_df_filter = trans_df_filter
+        self.top_n = top_n
+        self.print_counts = print_counts
+
+        self.counter = self._new_counter()
+        self.spill_dir = tempfile.mkdtemp(prefix='samnorsk-spill-', dir=spill_dir)
+        self.pair_runs = []
+        self.stats_runs = []
+        self.spilled_docs = 0
+        self.spills = 0
+
+        self._entries_bound = 0
+
+    def _new_counter(self):
+        return TranslationCounter(source_tf_filter=self.source_tf_filter, source_df_filter=self.source_df_filter,
+                                  trans_tf_filter=self.trans_tf_filter, trans_df_filter=self.trans_df_filter,
+                                  top_n=self.top_n, print_counts=self.print_counts)
+
+    @property
+    def count_docs(self):
+        return self.spilled_docs + self.counter.count_docs
+
+    def _run_fn(self, kind):
+        fd, fn = tempfile.mkstemp(prefix=kind + '-', dir=self.spill_dir)
+        os.close(fd)
+
+        return fn
+
+    def _check_budget(self, added):
+        # cheap upper bound first, only count entries when the bound is over budget
+        self._entries_bound += added
+
+        if self._entries_bound * ENTRY_BYTES <= self.memory_budget:
+            return
+
+        counter = self.counter
+        self._entries_bound = sum(len(counts) for counts in counter.count_dict.values()) + \
+            len(counter.source_tf) + len(counter.trans_tf)
+
+        if self._entries_bound * ENTRY_BYTES > self.memory_budget:
+            self.spill()
+
+    def update(self, pairs):
+        self.counter.update(pairs)
+        self._check_budget(2 * len(pairs))
+
+        return self
+
+    def merge(self, other_counter):
+        self.counter.merge(other_counter)
+        self._check_budget(sum(len(counts) for counts in other_counter.count_dict.values()) +
+                           len(other_counter.source_tf) + len(other_counter.trans_tf))
+
+        return self
+
+    def spill(self):
+        counter = self.counter
+
+        if counter.count_docs == 0 and not counter.count_dict:
+            return
+
+        # runs are sorted by translation: the counts are moved over to a by translation dict one source at a
+        # time and written one translation at a time, each freed as it goes, so they are never held twice
+        by_trans = {}
+
+        for source in list(counter.count_dict):
+            for trans, count in counter.count_dict.pop(source).items():
+                if trans in by_trans:
+                    by_trans[trans][source] = count
+                else:
+                    by_trans[trans] = {source: count}
+
+        self.pair_runs.append(self._run_fn('pairs'))
+        _write_run(self.pair_runs[-1], _popped_pairs(by_trans))
+        del by_trans
+
+        self.stats_runs.append(self._run_fn('stats'))
+        _write_run(self.stats_runs[-1], _popped_stats(counter))
+
+        self.spilled_docs += counter.count_docs
+        self.spills += 1
+        self.counter = self._new_counter()
+        self._entries_bound = 0
+
+        logging.info("spilled counts for %d documents to disk (%d runs)" % (counter.count_docs, self.spills))
+
+        if len(self.pair_runs) > MAX_RUNS:
+            self.pair_runs = [self._merge_runs(self.pair_runs, 2, 'pairs')]
+            self.stats_runs = [self._merge_runs(self.stats_runs, 1, 'stats')]
+
+    def _merge_runs(self, runs, n_keys, kind):
+        fn = self._run_fn(kind)
+        _write_run(fn, _merge_sum([_read_run(run, n_keys) for run in runs]))
+
+        for run in runs:
+            os.remove(run)
+
+        return fn
+
+    def _passes(self, values, tf_idx, tf_filter, df_filter):
+        return values is not None and values[tf_idx] >= tf_filter and \
+            values[tf_idx + 1] / float(self.count_docs) <= df_filter
+
+    def _format(self, word, count):
+        if self.print_counts:
+            return '%s:%d' % (word, count)
+        else:
+            return word
+
+    def print(self, f, format='counts'):
+        if not self.pair_runs:
+            # everything fit in memory
+            self.counter.print(f, format=format)
+            return
+
+        self.spill()
+
+        work_dir = tempfile.mkdtemp(prefix='print-', dir=self.spill_dir)
+
+        try:
+            self._print_runs(f, format, work_dir)
+        finally:
+            shutil.rmtree(work_dir)
+
+    def _print_runs(self, f, format, work_dir):
+        stats_fn = os.path.join(work_dir, 'stats')
+        _write_run(stats_fn, _merge_sum([_read_run(fn, 1) for fn in self.stats_runs]))
+
+        # pass 1: pairs by translation, keep translations passing the trans filters, re-sort by source
+        pairs = _with_stats(_merge_sum([_read_run(fn, 2) for fn in self.pair_runs]), _read_run(stats_fn, 1),
+                            lambda record: record[0][0])
+        source_runs = []
+        buf = []
+
+        for ((trans, source), values), trans_stats in pairs:
+            if not self._passes(trans_stats, 2, self.trans_tf_filter, self.trans_df_filter):
+                continue
+
+            buf.append(((source, trans), values))
+
+            if len(buf) >= RUN_RECORDS:
+                source_runs.append(os.path.join(work_dir, 'sources-%d' % len(source_runs)))
+                _write_run(source_runs[-1], sorted(buf))
+                buf = []
+
+        source_runs.append(os.path.join(work_dir, 'sources-%d' % len(source_runs)))
+        _write_run(source_runs[-1], sorted(buf))
+        del buf
+
+        # pass 2: one source at a time, apply the source filters and top-n
+        groups = ((key, [(trans, values[0]) for (_, trans), values in group]) for key, group
+                  in groupby(_merge_sum([_read_run(fn, 2) for fn in source_runs]), key=lambda record: record[0][0]))
+        lines = []
+
+        for (key, candidates), source_stats in _with_stats(groups, _read_run(stats_fn, 1), itemgetter(0)):
+            if not self._passes(source_stats, 0, self.source_tf_filter, self.source_df_filter):
+                continue
+
+            if self.top_n:
+                candidates = heapq.nsmallest(self.top_n, candidates, key=rank)
+            else:
+                candidates = sorted(candidates, key=rank)
+
+            if format == 'counts':
+                lines.append(u'%s\t%s\n' % (key, ' '.join([self._format(v, c) for v, c in candidates])))
+            elif format == 'solr':
+                lines.append(u'%s => %s\n' % (key, candidates[0][0]))
+
+            if len(lines) >= WRITE_BLOCK:
+                f.write(u''.join(lines))
+                lines = []
+
+        f.write(u''.join(lines))
+
+    def close(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
@@ -0,0 +1,111 @@
+from array import array
+
+import numpy as np
+
+from compact_counter import pack_keys
+
+# buffered keys are folded into the sorted count arrays once this many have been added
+COMPACT_EVERY = 1 << 20
+
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+
+# Counts of (source id, trans id) pairs for create_synonyms.py, as a sorted array of packed
+# (source id << 32 | trans id) keys and a parallel count array. Added keys are buffered
+# and folded in with a sort, so the pairs of a source id are always next to each other.
+class PairTable():
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+        self._pending = array('q')
+
+    def __len__(self):
+        self.compact()
+
+        return len(self.keys)
+
+    def compact(self, keys=None, counts=None):
+        all_keys = [self.keys]
+        all_counts = [self.counts]
+
+        if len(self._pending) > 0:
+            # most pairs repeat, counted on their own first the merge below is small
+            pending, pending_counts = np.unique(np.frombuffer(self._pending, dtype=np.int64), return_counts=True)
+
+            all_keys.append(pending)
+            all_counts.append(pending_counts.astype(np.int64))
+
+            self._pending = array('q')
+
+        if keys is not None:
+            all_keys.append(np.asarray(keys, dtype=np.int64))
+            all_counts.append(np.asarray(counts, dtype=np.int64))
+
+        if len(all_keys) == 1:
+            return self
+
+        keys = np.concatenate(all_keys)
+        counts = np.concatenate(all_counts)
+
+        if len(keys) == 0:
+            return self
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        counts = counts[order]
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self.keys = keys[starts]
+        self.counts = np.add.reduceat(counts, starts)
+
+        return self
+
+    def add_keys(self, keys):
+        # packed keys, each counted once
+        self._pending.extend(keys)
+
+        if len(self._pending) >= COMPACT_EVERY:
+            self.compact()
+
+        return self
+
+    def merge(self, keys, counts, remap=None):
+        # keys and counts of another table, with its ids mapped to ours through remap if given
+        keys = np.asarray(keys, dtype=np.int64)
+
+        if remap is not None:
+            remap = np.asarray(remap, dtype=np.int64)
+            keys = pack_keys(remap[keys >> _SHIFT], remap[keys & _MASK])
+
+        return self.compact(keys, counts)
+
+    def groups(self, min_count=20, share=0.3):
+        # (source id, trans ids) of every source id whose most common pair is counted at least min_count
+        # times, with the trans ids counted more than share of that, in id order
+        self.compact()
+
+        if len(self.keys) == 0:
+            return
+
+        source_ids = self.keys >> _SHIFT
+        starts = np.flatnonzero(np.r_[True, source_ids[1:] != source_ids[:-1]])
+        highest = np.maximum.reduceat(self.counts, starts)
+        sizes = np.diff(np.r_[starts, len(source_ids)])
+
+        selected = (np.repeat(highest >= min_count, sizes) &
+                    (self.counts > np.repeat(highest, sizes) * share))
+
+        keys = self.keys[selected]
+        source_ids = source_ids[selected]
+
+        if len(keys) == 0:
+            return
+
+        trans_ids = (keys & _MASK).tolist()
+        bounds = np.r_[np.flatnonzero(np.r_[True, source_ids[1:] != source_ids[:-1]]), len(keys)].tolist()
+        source_ids = source_ids.tolist()
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield source_ids[start], trans_ids[start:end]
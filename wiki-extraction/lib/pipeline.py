@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+
+try:
+    import queue
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import Queue as queue
+
+import stats
+
+
+class PipelineError(Exception):
+    pass
+
+
+def _worker(process, finish, in_queue, out_queue, initializer, initargs, profile_dir):
+    try:
+        with stats.profiled(profile_dir, 'worker-%d' % os.getpid()):
+            _work(process, finish, in_queue, out_queue, initializer, initargs)
+
+        out_queue.put(('stats', stats.take()))
+        out_queue.put(('done', None))
+    except Exception:
+        out_queue.put(('error', traceback.format_exc()))
+
+
+def _work(process, finish, in_queue, out_queue, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+
+    last_sent = time.time()
+
+    while True:
+        with stats.timer('wait_input'):
+            unit = in_queue.get()
+
+        if unit is None:
+            break
+
+        result = process(unit)
+
+        if result is not None:
+            with stats.timer('send_result'):
+                out_queue.put(('result', result))
+
+        if time.time() - last_sent >= stats.SEND_INTERVAL:
+            out_queue.put(('stats', stats.take()))
+            last_sent = time.time()
+
+    if finish is not None:
+        result = finish()
+
+        if result is not None:
+            with stats.timer('send_result'):
+                out_queue.put(('result', result))
+
+
+# Runs process() over a stream of work units in worker processes connected by bounded queues.
+# The input is fed from a thread so reading overlaps with processing, and a full input queue
+# blocks the reader instead of buffering the whole input in memory. Stats of the workers are merged
+# into the parent's, with profile_dir every worker writes its cProfile output there.
+class Pipeline():
+    def __init__(self, process, procs=1, queue_depth=None, finish=None, initializer=None, initargs=(),
+                 profile_dir=None):
+        self.process = process
+        self.procs = procs
+        self.queue_depth = queue_depth or 2 * procs
+        self.finish = finish
+        self.initializer = initializer
+        self.initargs = initargs
+        self.profile_dir = profile_dir
+
+    def _feed(self, units, in_queue, stop, errors):
+        try:
+            for unit in units:
+                while not stop.is_set():
+                    try:
+                        in_queue.put(unit, timeout=0.5)
+                        break
+                    except queue.Full:
+                        pass
+
+                if stop.is_set():
+                    return
+        except Exception:
+            errors.append(traceback.format_exc())
+        finally:
+            for _ in range(self.procs):
+                while not stop.is_set():
+                    try:
+                        in_queue.put(None, timeout=0.5)
+                        break
+                    except queue.Full:
+                        pass
+
+    def run(self, units):
+        in_queue = multiprocessing.Queue(maxsize=self.queue_depth)
+        out_queue = multiprocessing.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+        errors = []
+
+        workers = [multiprocessing.Process(target=_worker,
+                                           args=(self.process, self.finish, in_queue, out_queue,
+                                                 self.initializer, self.initargs, self.profile_dir))
+                   for _ in range(self.procs)]
+
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        feeder = threading.Thread(target=self._feed, args=(units, in_queue, stop, errors))
+        feeder.daemon = True
+        feeder.start()
+
+        try:
+            done = 0
+
+            while done < self.procs:
+                try:
+                    kind, value = out_queue.get(timeout=1.0)
+                except queue.Empty:
+                    dead = [w for w in workers if w.exitcode not in (None, 0)]
+
+                    if dead:
+                        raise PipelineError("worker %d died with exit code %d" % (dead[0].pid, dead[0].exitcode))
+
+                    continue
+
+                if kind == 'result':
+                    yield value
+                elif kind == 'stats':
+                    stats.merge(value)
+                    stats.progress()
+                elif kind == 'done':
+                    done += 1
+                else:
+                    raise PipelineError("worker failed:\n%s" % value)
+
+            feeder.join()
+
+            for worker in workers:
+                worker.join()
+
+            if errors:
+                raise PipelineError("reading input failed:\n%s" % errors[0])
+        finally:
+            stop.set()
+
+            # units still buffered for workers that are gone must not block the exit of this process
+            in_queue.cancel_join_thread()
+
+            for worker in workers:
+                if worker.is_alive():
+                    logging.warning("terminating worker %d" % worker.pid)
+                    worker.terminate()
+
+
+# Reorders items largest first within windows of bounded size, so long items start early
+# and do not hold up the tail of the stream.
+def size_sorted(items, window, key=len):
+    buf = []
+
+    for item in items:
+        buf.append(item)
+
+        if len(buf) >= window:
+            buf.sort(key=key, reverse=True)
+
+            for sorted_item in buf:
+                yield sorted_item
+
+            buf = []
+
+    buf.sort(key=key, reverse=True)
+
+    for sorted_item in buf:
+        yield sorted_item
@@ -0,0 +1,116 @@
+import re
+
+import nltk
+
+# 'punkt' splits exactly like nltk.sent_tokenize(), 'rules' is a faster approximation for Norwegian
+MODE = 'punkt'
+LANGUAGE = 'norwegian'
+
+# abbreviations, lowercased without the final period, that do not end a sentence in rules mode.
+# Abbreviations that are also common words, such as 'eg', 'min' or 'sto', are left out.
+ABBREVIATIONS = frozenset([
+    'adm', 'alm', 'ang', 'avd', 'bl.a', 'ca', 'cand', 'd.e', 'd.s', 'd.v.s', 'dept', 'dir', 'dr', 'dvs', 'e.kr',
+    'e.l', 'ekskl', 'el.l', 'etc', 'evt', 'f.eks', 'f.kr', 'f.o.m', 'fhv', 'fig', 'fk', 'hhv', 'hr', 'iflg', 'inkl',
+    'jf', 'jfr', 'jr', 'kap', 'kgl', 'kl', 'kr', 'm.a.o', 'm.fl', 'm.h.t', 'm.m', 'm.v', 'mht', 'mill', 'mnd',
+    'mrd', 'nr', 'o.a', 'o.l', 'o.s.v', 'obl', 'osb', 'osv', 'ofl', 'pga', 'pkt', 'pr', 'prof', 'resp', 'sml',
+    'snr', 'sr', 'st', 'stk', 't.d', 't.o.m', 'tils', 'tlf', 'ult', 'utg', 'vs', 'vsa', 'årh',
+])
+
+# a run of sentence punctuation and closing quotes followed by whitespace
+_END = re.compile(r'[.!?][.!?"\'»”’)\]]*(?=\s)', re.UNICODE)
+_SPACE = re.compile(r'\s*', re.UNICODE)
+_OPENING = '"\'«“‘(['
+_CLOSING = '"\'»”’)]'
+
+_segmenters = {}
+
+
+def _load_punkt(language):
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+    except ImportError:
+        # nltk < 3.8.2 ships the trained parameters as pickles
+        return nltk.data.load('tokenizers/punkt/%s.pickle' % language)
+
+    return PunktTokenizer(language)
+
+
+def _is_boundary(text, match):
+    if match.group().rstrip(_CLOSING) != '.':
+        return True
+
+    # the token the period ends
+    end = match.start()
+    word = text[max(text.rfind(' ', 0, end), text.rfind('\n', 0, end)) + 1:end].lstrip(_OPENING).lower()
+
+    if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+        return False
+
+    if word.isdigit():
+        # ordinals, as in '17. mai'
+        following = _SPACE.match(text, match.end()).end()
+
+        return not text[following:following + 1].islower()
+
+    return True
+
+
+def rule_spans(text):
+    spans = []
+    start = _SPACE.match(text).end()
+
+    for match in _END.finditer(text, start):
+        if match.end() > start and _is_boundary(text, match):
+            spans.append((start, match.end()))
+            start = _SPACE.match(text, match.end()).end()
+
+    end = len(text.rstrip())
+
+    if start < end:
+        spans.append((start, end))
+
+    return spans
+
+
+# Sentence spans (start, end) in article texts. In punkt mode text[start:end] are the sentences
+# nltk.sent_tokenize(text, language) returns, the punkt parameters are loaded once.
+class Segmenter():
+    def __init__(self, mode=MODE, language=LANGUAGE):
+        if mode not in ('punkt', 'rules'):
+            raise ValueError("unknown segmenter mode %s" % mode)
+
+        self.mode = mode
+        self.language = language
+        self._punkt = _load_punkt(language) if mode == 'punkt' else None
+
+    def spans(self, text):
+        if self._punkt is None:
+            return rule_spans(text)
+
+        return list(self._punkt.span_tokenize(text))
+
+    def segment(self, texts):
+        return [self.spans(text) for text in texts]
+
+
+def sentences(text, spans):
+    return [text[start:end] for start, end in spans]
+
+
+# the segmenter for the configured mode, created once per process
+def get_segmenter():
+    key = (MODE, LANGUAGE)
+
+    if key not in _segmenters:
+        _segmenters[key] = Segmenter(MODE, LANGUAGE)
+
+    return _segmenters[key]
+
+
+def set_mode(mode):
+    global MODE
+
+    if mode not in ('punkt', 'rules'):
+        raise ValueError("unknown segmenter mode %s" % mode)
+
+    MODE = mode
@@ -0,0 +1,139 @@
+import logging
+import os
+from functools import lru_cache
+
+try:
+    from fuzzywuzzy import fuzz
+
+    ratio = fuzz.ratio
+except ImportError:
+    from difflib import SequenceMatcher
+
+    # what fuzzywuzzy computes without python-Levenshtein
+    def ratio(a, b):
+        if a == b:
+            return 100
+
+        if not a or not b:
+            return 0
+
+        return int(round(100 * SequenceMatcher(None, a, b).ratio()))
+
+import stats
+from vocabulary import Vocabulary
+
+# token pairs less similar than this, in percent, are taken as misaligned
+MIN_RATIO = 40
+# consecutive misaligned pairs after which the rest of a sentence is dropped
+MAX_SKIPS = 3
+# id pairs whose ratio is kept per process
+CACHE_SIZE = 1 << 20
+# whether build_dictionary.py drops the rest of a sentence when the alignment drifts
+DRIFT_CHECK = False
+
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+_similarity = None
+_similarity_pid = None
+
+
+# Edit distance ratios of token pairs, memoized on pairs of ids in a vocabulary of its own. The
+# ratio is case sensitive, words are interned as they are given.
+class Similarity():
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.vocab = Vocabulary()
+        self.identical = 0
+        self._ratio = lru_cache(maxsize=cache_size)(self._compute)
+        self._reported = (0, 0, 0)
+
+    def _compute(self, key):
+        words = self.vocab.words
+
+        return ratio(words[key >> _SHIFT], words[key & _MASK])
+
+    def ids(self, words):
+        return self.vocab.ids(words)
+
+    def ratio(self, a, b):
+        # of two ids
+        if a == b:
+            self.identical += 1
+            return 100
+
+        return self._ratio((a << _SHIFT) | b)
+
+    def ratios(self, a_ids, b_ids):
+        # of the pairs of ids at the same position, e.g. all pairs of a sentence and its translation
+        cached = self._ratio
+        result = []
+        identical = 0
+
+        for a, b in zip(a_ids, b_ids):
+            if a == b:
+                identical += 1
+                result.append(100)
+            else:
+                result.append(cached((a << _SHIFT) | b))
+
+        self.identical += identical
+
+        return result
+
+    def report_stats(self):
+        # adds what was looked up since the last call to the stats of this process
+        info = self._ratio.cache_info()
+        hits, misses, identical = info.hits, info.misses, self.identical
+        last_hits, last_misses, last_identical = self._reported
+
+        stats.add('similarity_hits', hits - last_hits + identical - last_identical)
+        stats.add('similarity_misses', misses - last_misses)
+
+        self._reported = (hits, misses, identical)
+
+
+def drift_point(ratios, min_ratio=MIN_RATIO, max_skips=MAX_SKIPS):
+    # index of the pair where max_skips consecutive ratios below min_ratio end, or None
+    skips = 0
+
+    for i, r in enumerate(ratios):
+        if r < min_ratio:
+            skips += 1
+
+            if skips == max_skips:
+                return i
+        else:
+            skips = 0
+
+    return None
+
+
+def get_similarity():
+    # one per process, so the cache is shared by everything the process compares
+    global _similarity, _similarity_pid
+
+    if _similarity_pid != os.getpid():
+        _similarity = Similarity()
+        _similarity_pid = os.getpid()
+
+    return _similarity
+
+
+def drift_similarity():
+    # the similarity to check the alignment of build_dictionary.py with, if that is enabled
+    return get_similarity() if DRIFT_CHECK else None
+
+
+def set_drift_check(enabled):
+    global DRIFT_CHECK
+
+    DRIFT_CHECK = enabled
+
+
+def log_hit_rate():
+    counts = stats.current().counts
+    total = counts.get('similarity_hits', 0) + counts.get('similarity_misses', 0)
+
+    if total:
+        logging.info("%d token pairs compared, %.1f%% of them cached or identical" %
+                     (total, 100.0 * counts['similarity_hits'] / total))
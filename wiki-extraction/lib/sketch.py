@@ -0,0 +1,143 @@
+import hashlib
+import heapq
+import math
+from collections import Counter
+
+import numpy as np
+
+
+def _hashes(key):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+# Count-min sketch with conservative update. Estimates never undercount, and overcount by at most
+# epsilon * total count with probability 1 - delta. Supports the parts of the Counter interface
+# TranslationCounter uses: update() with an iterable, a mapping or another sketch, and item lookup.
+class CountMinSketch():
+    def __init__(self, epsilon=2e-6, delta=0.01):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1.0 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint32)
+        self.total = 0
+
+        self._rows = np.arange(self.depth, dtype=np.uint64)
+
+    def _columns(self, keys):
+        hashes = np.array([_hashes(key) for key in keys], dtype=np.uint64).reshape(-1, 2)
+
+        # double hashing, one column per row for every key: depth x len(keys)
+        return (hashes[:, 0] + self._rows[:, np.newaxis] * hashes[:, 1]) % np.uint64(self.width)
+
+    def __getitem__(self, key):
+        return int(self.table[np.arange(self.depth), self._columns([key])[:, 0]].min())
+
+    def __len__(self):
+        return self.total
+
+    def estimates(self, keys):
+        keys = list(keys)
+
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+
+        columns = self._columns(keys)
+
+        return self.table[np.arange(self.depth)[:, np.newaxis], columns].min(axis=0).astype(np.int64)
+
+    def update(self, items):
+        if isinstance(items, CountMinSketch):
+            return self.merge(items)
+
+        counts = items if hasattr(items, 'items') else Counter(items)
+
+        if not counts:
+            return self
+
+        keys = list(counts.keys())
+        values = np.array([counts[key] for key in keys], dtype=np.uint32)
+        columns = self._columns(keys)
+        rows = np.arange(self.depth)[:, np.newaxis]
+
+        # conservative update: raise each key's cells only up to its new estimate. Keys sharing a
+        # cell within one batch take the max, which still never undercounts.
+        estimates = self.table[rows, columns].min(axis=0) + values
+        np.maximum.at(self.table, (np.broadcast_to(rows, columns.shape), columns),
+                      np.broadcast_to(estimates, columns.shape))
+
+        self.total += int(values.sum())
+
+        return self
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("can not merge sketches of different dimensions")
+
+        self.table += other.table
+        self.total += other.total
+
+        return self
+
+
+# Space-Saving heavy hitters: keeps the capacity most frequent keys. A key's count overestimates its
+# true count by at most errors[key], which is at most total / capacity.
+class SpaceSaving():
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, key):
+        return self.counts.get(key, 0)
+
+    def items(self):
+        return self.counts.items()
+
+    def _pop_min(self):
+        # heap entries go stale when counts grow, re-insert them with their current count
+        while True:
+            count, key = heapq.heappop(self._heap)
+
+            if self.counts[key] == count:
+                return count, key
+
+            heapq.heappush(self._heap, (self.counts[key], key))
+
+    def add(self, key, count=1):
+        self.total += count
+
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (count, key))
+        else:
+            min_count, min_key = self._pop_min()
+
+            del self.counts[min_key]
+            del self.errors[min_key]
+
+            self.counts[key] = min_count + count
+            self.errors[key] = min_count
+            heapq.heappush(self._heap, (min_count + count, key))
+
+    def update(self, items):
+        if isinstance(items, SpaceSaving):
+            items = items.counts
+
+        counts = items if hasattr(items, 'items') else Counter(items)
+
+        for key, count in counts.items():
+            self.add(key, count)
+
+        return self
@@ -0,0 +1,178 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds between throughput log lines
+LOG_INTERVAL = 60.0
+# seconds between stats sent from a worker process to the parent
+SEND_INTERVAL = 10.0
+
+
+# the parent reads input in a feeder thread while merging worker stats in the main thread
+_lock = threading.Lock()
+
+
+# Seconds spent per stage and counts of things processed, summed over processes with merge().
+class Stats():
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, name, n=1):
+        with _lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_time(self, stage, secs):
+        with _lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + secs
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.time()
+
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.time() - start)
+
+    def merge(self, other):
+        for stage, secs in other.seconds.items():
+            self.add_time(stage, secs)
+
+        for name, n in other.counts.items():
+            self.add(name, n)
+
+        return self
+
+
+_stats = Stats()
+_stats_pid = os.getpid()
+_started = time.time()
+_last_log = [_started, {}]
+
+
+def current():
+    global _stats, _stats_pid
+
+    if _stats_pid != os.getpid():
+        # forked worker: what the parent counted so far is the parent's
+        _stats = Stats()
+        _stats_pid = os.getpid()
+
+    return _stats
+
+
+def add(name, n=1):
+    current().add(name, n)
+
+
+def timer(stage):
+    return current().timer(stage)
+
+
+def take():
+    # the stats of this process since the last take(), for sending to the parent
+    global _stats
+
+    stats = current()
+    _stats = Stats()
+
+    return stats
+
+
+def merge(other):
+    current().merge(other)
+
+
+def _rates(counts, since_counts, secs):
+    parts = []
+
+    for name, fmt, scale in [('articles', "%d articles (%.0f/s)", 1.0), ('sentences', "%d sentences (%.0f/s)", 1.0),
+                             ('bytes', "%.1f MB (%.1f MB/s)", 1e6)]:
+        if name in counts:
+            parts.append(fmt % (counts[name] / scale,
+                                (counts[name] - since_counts.get(name, 0)) / scale / max(secs, 1e-9)))
+
+    return ", ".join(parts)
+
+
+def progress():
+    # logs throughput since the previous log line, at most every LOG_INTERVAL seconds
+    now = time.time()
+
+    if now - _last_log[0] < LOG_INTERVAL:
+        return
+
+    with _lock:
+        counts = dict(current().counts)
+
+    logging.info("%s, %.0fs elapsed" % (_rates(counts, _last_log[1], now - _last_log[0]), now - _started))
+
+    _last_log[0] = now
+    _last_log[1] = counts
+
+
+def report():
+    # totals with seconds summed over all processes, stage shares are of that sum
+    elapsed = time.time() - _started
+    stats = current()
+    total_secs = sum(stats.seconds.values()) or 1.0
+
+    return {'elapsed': elapsed,
+            'counts': dict(stats.counts),
+            'rates': dict((name, n / elapsed) for name, n in stats.counts.items()),
+            'stages': dict((stage, {'seconds': secs, 'share': secs / total_secs})
+                           for stage, secs in sorted(stats.seconds.items()))}
+
+
+def write_report(fn, **extra):
+    result = report()
+    result.update(extra)
+
+    with io.open(fn, mode='w', encoding='utf-8') as f:
+        f.write(json.dumps(result, indent=2, sort_keys=True))
+
+    return result
+
+
+def log_report():
+    result = report()
+
+    logging.info("%s in %.0fs" % (_rates(result['counts'], {}, result['elapsed']), result['elapsed']))
+
+    for stage, stage_stats in sorted(result['stages'].items(), key=lambda item: -item[1]['seconds']):
+        logging.info("  %-12s %10.1fs %6.1f%%" % (stage, stage_stats['seconds'], 100.0 * stage_stats['share']))
+
+
+def start_profile(directory):
+    if not directory:
+        return None
+
+    profile = cProfile.Profile()
+    profile.enable()
+
+    return profile
+
+
+def stop_profile(profile, directory, name):
+    # cProfile output written to directory/name.prof, for pstats or snakeviz
+    if profile is None:
+        return
+
+    profile.disable()
+    profile.dump_stats(os.path.join(directory, '%s.prof' % name))
+
+
+@contextmanager
+def profiled(directory, name):
+    profile = start_profile(directory)
+
+    try:
+        yield
+    finally:
+        stop_profile(profile, directory, name)
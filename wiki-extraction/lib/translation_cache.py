@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+# sqlite's default limit on host parameters in a statement is 999
+_BATCH = 500
+# hits whose access time and counts are written at once, lookups only read so they do not hold the
+# write lock that all workers share
+TOUCH_EVERY = 10000
+
+
+class TranslationCache():
+    def __init__(self, fn, max_bytes=1 << 30, version='unknown'):
+        self.fn = fn
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._pid = None
+        self._touched = set()
+        self._pending_hits = 0
+        self._pending_misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        state['_touched'] = set()
+        state['_pending_hits'] = 0
+        state['_pending_misses'] = 0
+
+        return state
+
+    def _connection(self):
+        # every process (pool worker) needs its own connection
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.fn, timeout=120.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('CREATE TABLE IF NOT EXISTS translations '
+                         '(key BLOB PRIMARY KEY, trans TEXT NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS translations_atime ON translations (atime)')
+            conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.executemany('INSERT OR IGNORE INTO stats VALUES (?, 0)', [('hits',), ('misses',), ('bytes',)])
+            conn.execute('COMMIT')
+
+            self._conn = conn
+            self._pid = os.getpid()
+            self.hits = 0
+            self.misses = 0
+            self._touched = set()
+            self._pending_hits = 0
+            self._pending_misses = 0
+
+        return self._conn
+
+    def _key(self, direction, sent):
+        return sqlite3.Binary(hashlib.sha1(u'\0'.join([direction, self.version, sent]).encode('utf-8')).digest())
+
+    def lookup(self, sents, direction):
+        conn = self._connection()
+        keys = [self._key(direction, sent) for sent in sents]
+        found = {}
+
+        # a read in autocommit mode, concurrent with the other workers' reads and writes in WAL mode
+        for i in range(0, len(keys), _BATCH):
+            batch = keys[i:i + _BATCH]
+            rows = conn.execute('SELECT key, trans FROM translations WHERE key IN (%s)' %
+                                ','.join('?' * len(batch)), batch)
+            found.update((bytes(key), trans) for key, trans in rows)
+
+        hits = sum(1 for key in keys if bytes(key) in found)
+
+        self.hits += hits
+        self.misses += len(keys) - hits
+        self._pending_hits += hits
+        self._pending_misses += len(keys) - hits
+        self._touched.update(found)
+
+        if len(self._touched) >= TOUCH_EVERY:
+            self.flush()
+
+        return [found.get(bytes(key)) for key in keys]
+
+    def _write_touched(self, conn):
+        # access times and hit counts of the lookups since the last write, in the caller's transaction
+        now = time.time()
+        conn.executemany('UPDATE translations SET atime = ? WHERE key = ?',
+                         [(now, sqlite3.Binary(key)) for key in self._touched])
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (self._pending_hits,))
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (self._pending_misses,))
+
+        self._touched = set()
+        self._pending_hits = 0
+        self._pending_misses = 0
+
+    def flush(self):
+        # writes what lookups have not yet, workers call this before they exit
+        if self._pid != os.getpid() or not (self._touched or self._pending_hits or self._pending_misses):
+            return
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+
+        try:
+            self._write_touched(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def store(self, direction, items):
+        conn = self._connection()
+        now = time.time()
+        rows = [(self._key(direction, sent), trans, len(sent) + len(trans), now) for sent, trans in items]
+
+        conn.execute('BEGIN IMMEDIATE')
+
+        try:
+            added = 0
+
+            for row in rows:
+                if conn.execute('INSERT OR IGNORE INTO translations VALUES (?, ?, ?, ?)', row).rowcount:
+                    added += row[2]
+
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'bytes'", (added,))
+            self._write_touched(conn)
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn):
+        size = conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+
+        if size <= self.max_bytes:
+            return
+
+        # evict down to 90% of the cap so we don't evict on every store
+        target = int(self.max_bytes * 0.9)
+
+        while size > target:
+            rows = conn.execute('SELECT key, size FROM translations ORDER BY atime LIMIT 1000').fetchall()
+
+            if not rows:
+                break
+
+            for key, row_size in rows:
+                if size <= target:
+                    break
+
+                conn.execute('DELETE FROM translations WHERE key = ?', (key,))
+                size -= row_size
+
+        conn.execute("UPDATE stats SET value = ? WHERE name = 'bytes'", (max(size, 0),))
+
+    def stats(self):
+        self.flush()
+        conn = self._connection()
+        stats = dict(conn.execute('SELECT name, value FROM stats'))
+        stats['entries'] = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+        return stats
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self.flush()
+            self._conn.close()
+
+        self._conn = None
+        self._pid = None
@@ -1,5 +1,14 @@
+import heapq
 from collections import Counter
-from operator import itemgetter
+import dictionary_file
+
+# lines written per call to f.write() in print
+WRITE_BLOCK = 10000
+
+
+# orders translations by descending count, ties by translation
+def rank(candidate):
+    return -candidate[1], candidate[0]
 
 
 class TranslationCounter():
@@ -29,9 +38,16 @@ class TranslationCounter():
 
         return self
 
-    def _filtered_trans(self, word):
-        return not ((self.trans_tf[word] >= self.trans_tf_filter) and
-                    (self.trans_df[word] / float(self.count_docs) <= self.trans_df_filter))
+    def _passing(self, words, tf, df, tf_filter, df_filter):
+        docs = float(self.count_docs)
+
+        return set(word for word in words if tf[word] >= tf_filter and df[word] / docs <= df_filter)
+
+    def _source_words(self):
+        return self.source_tf.keys()
+
+    def _trans_words(self):
+        return self.trans_tf.keys()
 
     def _format(self, word, count):
         if self.print_counts:
@@ -55,26 +71,103 @@ class TranslationCounter():
 
         return self
 
-    def print(self, f, format='counts'):
-        for key, counts in self.count_dict.items():
-            if (self.source_tf[key] >= self.source_tf_filter) and \
-                    (self.source_df[key] / float(self.count_docs) <= self.source_df_filter):
-                candidates = [(v, c) for v, c in counts.items() if not self._filtered_trans(v)]
-                candidates = sorted(candidates, key=itemgetter(1), reverse=True)
-            elif len(self.source_tf) == 0:
-                # no tf/df counts - dictionary read from file
-                candidates = sorted(counts.items(), key=itemgetter(1), reverse=True)
+    # inverse of update(pairs), removes one document's pairs from the counts
+    def subtract(self, pairs):
+        if len(pairs) == 0:
+            return self
+
+        self.count_docs -= 1
+
+        source_tokens, trans_tokens = zip(*pairs)
+
+        for stats, tokens in [(self.source_tf, source_tokens), (self.source_df, set(source_tokens)),
+                              (self.trans_tf, trans_tokens), (self.trans_df, set(trans_tokens))]:
+            stats.subtract(tokens)
+
+            for token in set(tokens):
+                if stats[token] <= 0:
+                    del stats[token]
+
+        for a, b in pairs:
+            counter = self.count_dict[a]
+            counter[b] -= 1
+
+            if counter[b] <= 0:
+                del counter[b]
+
+                if not counter:
+                    del self.count_dict[a]
+
+        return self
+
+    def merge(self, other_counter):
+        for key, counter in other_counter.count_dict.items():
+            if key in self.count_dict:
+                self.count_dict[key].update(counter)
+            else:
+                self.count_dict[key] = Counter(counter)
+
+        self.source_tf.update(other_counter.source_tf)
+        self.trans_tf.update(other_counter.trans_tf)
+        self.source_df.update(other_counter.source_df)
+        self.trans_df.update(other_counter.trans_df)
+        self.count_docs += other_counter.count_docs
+
+        return self
+
+    def _selected(self):
+        # (key, [(translation, count), ...]) in the order print() writes them
+        # no tf/df counts - dictionary read from file
+        unfiltered = self.count_docs == 0
+
+        if not unfiltered:
+            sources = self._passing(self._source_words(), self.source_tf, self.source_df,
+                                    self.source_tf_filter, self.source_df_filter)
+            translations = self._passing(self._trans_words(), self.trans_tf, self.trans_df,
+                                         self.trans_tf_filter, self.trans_df_filter)
+
+        # sorted, so the output does not depend on the order shards were merged in
+        for key in sorted(self.count_dict):
+            counts = self.count_dict[key]
+
+            if unfiltered:
+                candidates = counts.items()
+            elif key in sources:
+                candidates = [(v, c) for v, c in counts.items() if v in translations]
             else:
                 continue
 
             if self.top_n:
-                candidates = candidates[:self.top_n]
+                candidates = heapq.nsmallest(self.top_n, candidates, key=rank)
+            else:
+                candidates = sorted(candidates, key=rank)
 
             if candidates:
-                if format == 'counts':
-                    f.write(u'%s\t%s\n' % (key, ' '.join([self._format(v, c) for v, c in candidates])))
-                elif format == 'solr':
-                    f.write(u'%s => %s\n' % (key, candidates[0][0]))
+                yield key, candidates
+
+    def print(self, f, format='counts'):
+        lines = []
+
+        for key, candidates in self._selected():
+            if format == 'counts':
+                lines.append(u'%s\t%s\n' % (key, ' '.join([self._format(v, c) for v, c in candidates])))
+            elif format == 'solr':
+                lines.append(u'%s => %s\n' % (key, candidates[0][0]))
+
+            if len(lines) >= WRITE_BLOCK:
+                f.write(u''.join(lines))
+                lines = []
+
+        f.write(u''.join(lines))
+
+    # the dictionary print() writes, as the counter read() would return for it
+    def filtered(self):
+        inst = TranslationCounter()
+
+        for key, candidates in self._selected():
+            inst.count_dict[key] = Counter(dict(candidates))
+
+        return inst
 
     def cross_merge(self, other_counter):
         for key, counter in other_counter.count_dict.items():
@@ -86,6 +179,15 @@ class TranslationCounter():
 
         return self
 
+    # writes the binary dictionary format, raw keeps unfiltered counts and tf/df for later merging
+    def save(self, fn, raw=False):
+        dictionary_file.save(self, fn, raw=raw)
+
+    # memory maps a binary dictionary, returns a CompactTranslationCounter with the same API
+    @staticmethod
+    def load(fn):
+        return dictionary_file.load(fn)
+
     @staticmethod
     def read(f):
         inst = TranslationCounter()
@@ -99,6 +201,24 @@ class TranslationCounter():
             key, counts = line.split('\t')
 
             inst.count_dict[key] = Counter({trans: int(count) for trans, count
-                                            in [item.split(':') for item in counts.split()]})
+                                            in [item.rsplit(':', 1) for item in counts.split()]})
 
         return inst
+
+
+def merge_tree(counters):
+    counters = list(counters)
+
+    if not counters:
+        return TranslationCounter()
+
+    # merge pairwise so every level works on similarly sized counters
+    while len(counters) > 1:
+        merged = [a.merge(b) for a, b in zip(counters[0::2], counters[1::2])]
+
+        if len(counters) % 2 == 1:
+            merged.append(counters[-1])
+
+        counters = merged
+
+    return counters[0]
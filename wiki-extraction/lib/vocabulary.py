@@ -0,0 +1,103 @@
+import re
+
+import numpy as np
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+# lowercases the whole text once instead of every token
+def split_words(text):
+    return _TOKEN.findall(text.lower())
+
+
+class Vocabulary():
+    def __init__(self, words=()):
+        self.words = []
+        self.index = {}
+
+        for word in words:
+            self.id(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def id(self, word):
+        idx = self.index.get(word)
+
+        if idx is None:
+            idx = len(self.words)
+            self.index[word] = idx
+            self.words.append(word)
+
+        return idx
+
+    def ids(self, words):
+        index = self.index
+        result = []
+
+        for word in words:
+            idx = index.get(word)
+
+            if idx is None:
+                idx = len(self.words)
+                index[word] = idx
+                self.words.append(word)
+
+            result.append(idx)
+
+        return result
+
+    def tokenize(self, text):
+        return self.ids(split_words(text))
+
+    def word(self, idx):
+        return self.words[idx]
+
+    def merge(self, other):
+        # interns every word of other, returns an array mapping other's ids to ours
+        return np.array(self.ids(other.words), dtype=np.int64)
+
+
+# utf-8 strings stored back to back in blob, string i spans blob[offsets[i]:offsets[i + 1]]
+class StringTable():
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        data = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield data[start:end].decode('utf-8')
+
+
+# Vocabulary over a (memory mapped) StringTable. Lookups by id decode single strings on demand,
+# the word to id index is only built when a word is looked up or added.
+class MappedVocabulary(Vocabulary):
+    # noinspection PyMissingConstructor
+    def __init__(self, table):
+        self._table = table
+        self._words = None
+        self._index = None
+
+    @property
+    def words(self):
+        return self._table if self._index is None else self._words
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._words = list(self._table)
+            self._index = dict((word, idx) for idx, word in enumerate(self._words))
+
+        return self._index
@@ -1,11 +1,22 @@
 import io
 import json
-import logging
 import os
 import re
 from bz2 import BZ2File
 from gzip import GzipFile
 
+import stats
+from vocabulary import split_words
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_PAGE_TYPE = re.compile(br'"_type"\s*:\s*"page"')
+_ID = re.compile(br'"_id"\s*:\s*"([^"\\]*)"')
+_STRING = re.compile(br'"([^"\\]*(?:\\.[^"\\]*)*)"')
+
 
 def is_page(action, source):
     if ('index' in action) and ('_id' in action['index']) and ('_type' in action['index']) \
@@ -15,7 +26,140 @@ def is_page(action, source):
     return False
 
 
-def articles(wiki_json_fn, limit=None):
+def _json_loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line.decode('utf-8'))
+
+
+def _string_value(line, start):
+    # contents of the JSON string starting at start, found with find() rather than a regex as
+    # article texts are long
+    if line[start:start + 1] != b'"':
+        return None
+
+    end = start
+
+    while True:
+        end = line.find(b'"', end + 1)
+
+        if end == -1:
+            return None
+
+        # the quote is escaped if an odd number of backslashes precede it
+        escape = end - 1
+
+        while line[escape] == 92:
+            escape -= 1
+
+        if (end - 1 - escape) % 2 == 0:
+            return line[start + 1:end]
+
+
+def _string_field(key, line):
+    # value of a string field of the top level object. Nested objects may use the same key, so the
+    # nesting depth is worked out up to every occurrence. Returns None if there is no such field and
+    # False if its value is not a string, or if a match may be inside a string and only a full decode
+    # can tell.
+    depth = 0
+    segment_start = 0
+    pos = line.find(key)
+
+    while pos != -1:
+        colon = pos + len(key)
+
+        while line[colon:colon + 1] in (b' ', b'\t'):
+            colon += 1
+
+        if line[colon:colon + 1] == b':':
+            # an escaped opening quote, e.g. of a string ending in \"title before '":', is part of a string
+            escape = pos - 1
+
+            while escape >= 0 and line[escape] == 92:
+                escape -= 1
+
+            if (pos - 1 - escape) % 2 == 1:
+                return False
+
+            # any other match opens a key, so neither it nor the segments between matches start in a string
+            segment = _STRING.sub(b'', line[segment_start:pos])
+            depth += segment.count(b'{') + segment.count(b'[') - segment.count(b'}') - segment.count(b']')
+            segment_start = pos
+
+            if depth == 1:
+                start = colon + 1
+
+                while line[start:start + 1] in (b' ', b'\t'):
+                    start += 1
+
+                value = _string_value(line, start)
+
+                if value is None:
+                    return False
+
+                return json.loads(b'"' + value + b'"') if b'\\' in value else value.decode('utf-8')
+
+        pos = line.find(key, pos + 1)
+
+    return None
+
+
+# Parses an action/source line pair straight from bytes. Documents that are not pages are rejected
+# from the action line alone, and only id, title and text are picked out of the source line, with
+# orjson if it is installed. Returns None for anything but pages.
+def parse_page(action_line, source_line):
+    if _PAGE_TYPE.search(action_line) is None:
+        return None
+
+    match = _ID.search(action_line)
+
+    if match is None:
+        action = _json_loads(action_line)
+        source = _json_loads(source_line)
+
+        return {'id': action['index']['_id'], 'title': source['title'], 'text': source['text']} \
+            if is_page(action, source) else None
+
+    if orjson is not None:
+        source = orjson.loads(source_line)
+        title = source.get('title')
+        text = source.get('text')
+    else:
+        title = _string_field(b'"title"', source_line)
+        text = _string_field(b'"text"', source_line)
+
+        if title is False or text is False:
+            source = json.loads(source_line.decode('utf-8'))
+            title = source.get('title')
+            text = source.get('text')
+
+    if title is None or text is None:
+        return None
+
+    return {'id': match.group(1).decode('utf-8'), 'title': title, 'text': text}
+
+
+def is_xml_dump(fn):
+    base, ext = os.path.splitext(fn)
+
+    return ext == '.xml' or (ext in ('.gz', '.bz2') and base.endswith('.xml'))
+
+
+# Yields the pages of a cirrussearch dump. offset is a position in the uncompressed stream returned
+# with each article when with_offsets is set, reading starts there instead of at the beginning.
+# MediaWiki XML dumps (.xml, .xml.gz, .xml.bz2) are read by wikipedia_xml, with procs processes
+# for multistream bz2.
+def articles(wiki_json_fn, limit=None, offset=0, with_offsets=False, procs=1):
+    if is_xml_dump(wiki_json_fn):
+        if offset or with_offsets:
+            raise ValueError("input offsets are not supported for XML dumps")
+
+        # imported here, the XML reader depends on this module through dump_ranges
+        from wikipedia_xml import xml_articles
+
+        for article in xml_articles(wiki_json_fn, limit=limit, procs=procs):
+            yield article
+
+        return
+
     count = 0
 
     _, ext = os.path.splitext(wiki_json_fn)
@@ -27,34 +171,39 @@ def articles(wiki_json_fn, limit=None):
     else:
         f = io.open(wiki_json_fn, mode='rb')
 
+    if offset:
+        f.seek(offset)
+
     while True:
-        line = f.readline()
+        with stats.timer('read'):
+            line = f.readline()
+            source_line = f.readline()
 
-        if line == b'':
+        if line == b'' or source_line == b'':
             break
 
-        action = json.loads(line.decode('utf-8'))
-
-        line = f.readline()
+        with stats.timer('parse'):
+            article = parse_page(line, source_line)
 
-        if line == b'':
-            break
+        stats.add('bytes', len(line) + len(source_line))
 
-        source = json.loads(line.decode('utf-8'))
+        if article is not None:
+            stats.add('articles')
 
-        if is_page(action, source):
-            yield {'id': action['index']['_id'], 'title': source['title'], 'text': source['text']}
+            if with_offsets:
+                yield article, f.tell()
+            else:
+                yield article
 
             count += 1
 
         if limit and count > limit:
             return
 
-        if count % 10000 == 0:
-            logging.info("read %d articles" % count)
+        stats.progress()
 
     f.close()
 
 
 def tokenize(text):
-    return [token.lower() for token in re.findall(r'\w+', text, re.UNICODE | re.MULTILINE)]
\ No newline at end of file
+    return split_words(text)
\ No newline at end of file
@@ -0,0 +1,273 @@
+import html
+import io
+import logging
+import os
+import re
+from bz2 import BZ2File
+from collections import deque
+from gzip import GzipFile
+from multiprocessing import Pool
+from xml.etree import ElementTree
+
+import stats
+from dump_ranges import READ_BYTES, bz2_streams, inflate
+
+# compressed bytes of bz2 streams decompressed and parsed per task when reading in parallel
+GROUP_BYTES = 4 * 1024 * 1024
+
+_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_REF = re.compile(r'<ref[^>/]*/>|<ref[^>]*>.*?</ref>', re.DOTALL | re.IGNORECASE)
+_BLOCK_TAGS = re.compile(r'<(math|gallery|timeline|syntaxhighlight|source|pre|score)[^>]*>.*?</\1>',
+                         re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r'</?[a-zA-Z][^>]*>')
+_TEMPLATE = re.compile(r'\{\{[^{}]*\}\}')
+_TABLE = re.compile(r'\{\|(?:(?!\{\|)(?!\|\}).)*\|\}', re.DOTALL)
+_MEDIA_LINK = re.compile(r'\[\[(?:file|fil|image|bilde|category|kategori|media):[^\[\]]*\]\]', re.IGNORECASE)
+_LINK = re.compile(r'\[\[(?:[^\[\]|]*\|)?([^\[\]]*)\]\]')
+_EXTERNAL_LINK = re.compile(r'\[(?:https?:|ftp:)?//[^\s\]]*\s*([^\]]*)\]')
+_EMPHASIS = re.compile(r"'{2,}")
+_HEADING = re.compile(r'^=+\s*(.*?)\s*=+\s*$', re.MULTILINE)
+_LIST = re.compile(r'^[*#:;]+\s*', re.MULTILINE)
+_MAGIC_WORD = re.compile(r'__[A-Z]+__')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+def _innermost(pattern, repl, text):
+    # nested constructs are removed from the inside out
+    while True:
+        text, n = pattern.subn(repl, text)
+
+        if n == 0:
+            return text
+
+
+# Reduces wikitext to plain running text: templates, tables, references, comments, markup tags, files and
+# categories are removed, links are replaced by their label, and headings and list items keep their text.
+def strip_wikitext(text):
+    # a pass is skipped when the markup it removes can not occur, most pages lack some of it
+    if '<' in text:
+        text = _COMMENT.sub('', text)
+        text = _REF.sub('', text)
+        text = _BLOCK_TAGS.sub('', text)
+
+    if '{{' in text:
+        text = _innermost(_TEMPLATE, '', text)
+
+    if '{|' in text:
+        text = _innermost(_TABLE, '', text)
+
+    # innermost first: links in a file caption are replaced before the file link itself is removed
+    while '[[' in text:
+        stripped = _LINK.sub(r'\1', _MEDIA_LINK.sub('', text))
+
+        if stripped == text:
+            break
+
+        text = stripped
+
+    if '//' in text:
+        text = _EXTERNAL_LINK.sub(r'\1', text)
+
+    if '<' in text:
+        text = _TAG.sub('', text)
+
+    if "''" in text:
+        text = _EMPHASIS.sub('', text)
+
+    if '=' in text:
+        text = _HEADING.sub(r'\1', text)
+
+    text = _LIST.sub('', text)
+
+    if '__' in text:
+        text = _MAGIC_WORD.sub('', text)
+
+    if '&' in text:
+        text = html.unescape(text)
+
+    return _BLANK_LINES.sub('\n', text).strip()
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _page(elem):
+    # article dict for a main namespace page that is not a redirect, else None
+    fields = {}
+
+    for child in elem:
+        name = _local(child.tag)
+
+        if name == 'revision':
+            for rev_child in child:
+                if _local(rev_child.tag) == 'text':
+                    fields['text'] = rev_child.text or ''
+        else:
+            fields[name] = child.text
+
+    if fields.get('ns') != '0' or 'redirect' in fields or 'text' not in fields:
+        return None
+
+    return {'id': fields['id'], 'title': fields['title'], 'text': strip_wikitext(fields['text'])}
+
+
+def _open(fn):
+    _, ext = os.path.splitext(fn)
+
+    if ext == '.gz':
+        return GzipFile(fn, mode='r')
+    elif ext == '.bz2':
+        return BZ2File(fn, mode='r')
+    else:
+        return io.open(fn, mode='rb')
+
+
+def _pages(fn):
+    # pull parser fed in blocks, finished pages are dropped from the tree so memory use stays flat
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    root = None
+
+    with _open(fn) as f:
+        while True:
+            with stats.timer('read'):
+                data = f.read(READ_BYTES)
+
+            if not data:
+                break
+
+            stats.add('bytes', len(data))
+
+            with stats.timer('parse'):
+                parser.feed(data)
+                found = []
+
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        if root is None:
+                            root = elem
+                    elif _local(elem.tag) == 'page':
+                        article = _page(elem)
+                        root.clear()
+
+                        if article is not None:
+                            found.append(article)
+
+            for article in found:
+                yield article
+
+    parser.close()
+
+
+def _page_data(fn, start, end):
+    # the pages in bz2 streams [start, end), None if the streams do not hold whole pages
+    with io.open(fn, mode='rb') as f:
+        data = b''.join(inflate(f, 'bz2', start, end))
+
+    first = data.find(b'<page>')
+
+    if first == -1:
+        # header only or the closing tag
+        return b'' if b'</page>' not in data else None
+
+    if b'<mediawiki' in data[:first]:
+        data = data[first:]
+
+    data = data.replace(b'</mediawiki>', b'').strip()
+
+    if not (data.startswith(b'<page>') and data.endswith(b'</page>')):
+        return None
+
+    return data
+
+
+def _stream_articles(unit):
+    # the articles of a group of streams, and the stats of reading them
+    fn, start, end = unit
+
+    with stats.timer('read'):
+        data = _page_data(fn, start, end)
+
+    if data is None:
+        raise ValueError("bz2 streams of %s do not hold whole pages" % fn)
+
+    articles = []
+
+    if data:
+        stats.add('bytes', len(data))
+
+        with stats.timer('parse'):
+            for elem in ElementTree.fromstring(b'<pages>' + data + b'</pages>'):
+                article = _page(elem)
+
+                if article is not None:
+                    articles.append(article)
+
+    return articles, stats.take()
+
+
+def _merged(result):
+    articles, worker_stats = result
+    stats.merge(worker_stats)
+
+    return articles
+
+
+def _parallel_pages(fn, offsets, procs):
+    size = os.path.getsize(fn)
+    bounds = [0]
+
+    for offset in offsets:
+        if offset - bounds[-1] >= GROUP_BYTES:
+            bounds.append(offset)
+
+    units = [(fn, start, end) for start, end in zip(bounds, bounds[1:] + [size])]
+    pool = Pool(processes=procs)
+    pending = deque()
+
+    try:
+        for unit in units:
+            pending.append(pool.apply_async(_stream_articles, (unit,)))
+
+            # results are taken in order, and at most 2 * procs groups are decompressed ahead
+            if len(pending) >= 2 * procs:
+                for article in _merged(pending.popleft().get()):
+                    yield article
+
+        while pending:
+            for article in _merged(pending.popleft().get()):
+                yield article
+    finally:
+        pool.terminate()
+
+
+# Yields the main namespace pages of a MediaWiki pages-articles XML dump (.xml, .xml.gz or .xml.bz2) as
+# the same id, title and text dicts as wikipedia.articles(), with the wikitext reduced to plain text.
+# Streams of a multistream bz2 dump are decompressed and parsed by procs processes.
+def xml_articles(fn, limit=None, procs=1):
+    count = 0
+    gen = None
+
+    if procs > 1 and fn.endswith('.bz2'):
+        offsets = bz2_streams(fn)
+
+        if len(offsets) > 2 and _page_data(fn, offsets[1], offsets[2]) is not None:
+            gen = _parallel_pages(fn, offsets, procs)
+        else:
+            logging.warning("%s is not a multistream dump of whole pages, reading it in one process" % fn)
+
+    if gen is None:
+        gen = _pages(fn)
+
+    for article in gen:
+        stats.add('articles')
+
+        yield article
+
+        count += 1
+
+        if limit and count > limit:
+            gen.close()
+            return
+
+        stats.progress()
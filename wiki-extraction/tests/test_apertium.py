@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'lib'))
+
+import apertium
+from apertium import BatchTranslator
+from translation_cache import TranslationCache
+
+DOCS = [[u'a1', u'a2'], [u'b1', u'b2', u'b3'], [u'c1']]
+
+
+# stands in for a pool of apertium pipelines, upper cases every line and merges b1 and b2 into one line
+class MergingPool():
+    def translate(self, sents):
+        output = []
+
+        for sent in sents:
+            if sent == u'b2' and output and output[-1] == u'B1':
+                output[-1] += u' B2'
+            else:
+                output.append(sent.upper())
+
+        return output
+
+
+@pytest.fixture
+def merging_pool(monkeypatch):
+    monkeypatch.setattr(apertium, '_pools', {'nno-nob': MergingPool()})
+    monkeypatch.setattr(apertium, '_pools_pid', os.getpid())
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_misaligned_batch_falls_back(merging_pool, tmpdir, cached):
+    cache = TranslationCache(str(tmpdir.join('cache.sqlite'))) if cached else None
+    apertium.set_cache(cache)
+
+    try:
+        translator = BatchTranslator('nno-nob')
+        results = translator.translate(DOCS)
+    finally:
+        apertium.set_cache(None)
+
+    assert results == [[u'A1', u'A2'], [u'B1 B2', u'B3'], [u'C1']]
+    assert translator.fallbacks == 1
+
+    if cached:
+        # only what lined up with its input was cached
+        assert cache.lookup([u'a1', u'b1', u'b3'], 'nno-nob') == [u'A1', None, None]
+        cache.close()